@@ -3,19 +3,87 @@ from config import Config
 import pyrebase
 import firebase_admin
 from firebase_admin import credentials
+import firebase_admin.auth
 from flask_login import LoginManager
+from werkzeug.local import LocalProxy
+from app.http import HttpClient
+from app.tasks import TaskQueue
+from app.assets import Assets
+from app.metrics import Instrumented
+from app.forks import PerProcess
+from app import metrics
+import threading
 
 login_manager = LoginManager()
+http = HttpClient()
+tasks = TaskQueue()
+assets = Assets()
 
-firebase = pyrebase.initialize_app(Config.DB)
-pyr_db = firebase.database()
-pyr_auth = firebase.auth()
-pyr_store = firebase.storage()
+# Firebase clients are built on first use, once per process
+def build_clients():
+    firebase = pyrebase.initialize_app(Config.DB)
+    return {
+        "firebase": firebase,
+        "db": Instrumented('pyr_db', firebase.database()),
+        "auth": Instrumented('pyr_auth', firebase.auth()),
+        "store": Instrumented('pyr_store', firebase.storage())
+    }
 
-# Checks for if there is already an active firebase app
-if (not len(firebase_admin._apps)):
-    cred = credentials.Certificate(Config.DB['serviceAccount'])
-    firebase_admin.initialize_app(cred)
+_clients = PerProcess(build_clients)
+
+def get_firebase():
+    return _clients.get()['firebase']
+
+def get_db():
+    return _clients.get()['db']
+
+def get_auth():
+    return _clients.get()['auth']
+
+def get_store():
+    return _clients.get()['store']
+
+def init_admin():
+    # Checks for if there is already an active firebase app
+    if (not len(firebase_admin._apps)):
+        cred = credentials.Certificate(Config.DB['serviceAccount'])
+        firebase_admin.initialize_app(cred)
+    return True
+
+def discard_admin(inherited):
+    # an app inherited from the parent process is replaced with a new one
+    if len(firebase_admin._apps):
+        firebase_admin.delete_app(firebase_admin.get_app())
+
+_admin = PerProcess(init_admin, discard=discard_admin)
+
+def get_admin_auth():
+    _admin.get()
+
+    # not `auth`, that name is the app.auth blueprint package once it's imported
+    return Instrumented('admin_auth', firebase_admin.auth)
+
+pyr_db = LocalProxy(get_db)
+pyr_auth = LocalProxy(get_auth)
+pyr_store = LocalProxy(get_store)
+admin_auth = LocalProxy(get_admin_auth)
+
+# pyrebase builds the query path on the Database object itself,
+# so worker threads each need their own instead of sharing pyr_db
+_thread_locals = PerProcess(threading.local)
+
+def thread_db():
+    local = _thread_locals.get()
+    if not hasattr(local, 'db'):
+        local.db = Instrumented('pyr_db', get_firebase().database())
+    return local.db
+
+def thread_store():
+    # same for storage, the path is kept on the Storage object
+    local = _thread_locals.get()
+    if not hasattr(local, 'store'):
+        local.store = Instrumented('pyr_store', get_firebase().storage())
+    return local.store
 
 def create_app(config_class=Config):
 
@@ -23,6 +91,10 @@ def create_app(config_class=Config):
     app.config.from_object(Config)
 
     login_manager.init_app(app)
+    http.init_app(app)
+    tasks.init_app(app)
+    assets.init_app(app)
+    metrics.init_app(app)
 
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -33,6 +105,9 @@ def create_app(config_class=Config):
     from app.teams import bp as teams_bp
     app.register_blueprint(teams_bp, url_prefix='/teams')
 
+    from app.teams.mirror import mirror
+    mirror.init_app(app)
+
     from app.charts import bp as charts_bp
     app.register_blueprint(charts_bp, url_prefix='/charts')
 
@@ -0,0 +1,135 @@
+from flask import request, send_from_directory, current_app
+from flask.cli import with_appcontext
+import click
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import shutil
+
+# `flask assets build` copies app/static to app/static/dist with a content
+# hash in every name, plus .gz and .br versions. Once built, url_for('static')
+# points at the hashed copies, which are served with immutable cache headers
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.txt', '.svg', '.json', '.html', '.map'}
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')] # preferred first on a tie
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Assets():
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.static_folder = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.manifest = load_manifest(app.static_folder)
+
+        app.url_defaults(self.fingerprint)
+        app.view_functions['static'] = self.send_static
+        app.cli.add_command(assets_cli)
+        app.extensions['assets'] = self
+
+    def url(self, filename):
+        # same name url_for('static') ends up with
+        return self.manifest.get(filename, filename)
+
+    def fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.url(values['filename'])
+
+    def send_static(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return current_app.send_static_file(filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        # the client's q-values decide, ties go to the order in ENCODINGS
+        available = {encoding: suffix for encoding, suffix in ENCODINGS
+            if os.path.isfile(os.path.join(self.static_folder, filename + suffix))}
+        encoding = request.accept_encodings.best_match(list(available) + ['identity'])
+
+        if encoding in available:
+            response = send_from_directory(self.static_folder, filename + available[encoding], mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(self.static_folder, filename, mimetype=mimetype)
+
+        # the name changes whenever the content does
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {} # not built, plain static files
+
+
+def build(static_folder):
+    import brotli # only needed to build
+
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [name for name in dirs if os.path.join(root, name) != dist]
+
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            base, ext = os.path.splitext(filename)
+            digest = hashlib.md5(data).hexdigest()[:12]
+            hashed = f'{DIST}/{base}.{digest}{ext}'
+            manifest[filename] = hashed
+
+            target = os.path.join(static_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            write(target, data)
+
+            if ext.lower() in COMPRESSIBLE:
+                # only keep the compressed versions that are actually smaller
+                for suffix, compressed in [('.gz', gzip_bytes(data)), ('.br', brotli.compress(data, quality=11))]:
+                    if len(compressed) < len(data):
+                        write(target + suffix, compressed)
+
+    write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+def gzip_bytes(data):
+    # fixed mtime so a rebuild of the same file gives the same bytes
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@click.group('assets')
+def assets_cli():
+    pass
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    # flask assets build, run before deploying
+    manifest = build(current_app.static_folder)
+    current_app.extensions['assets'].manifest = manifest
+    print('Fingerprinted {0} static files into {1}'.format(len(manifest), os.path.join(current_app.static_folder, DIST)))
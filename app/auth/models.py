@@ -1,10 +1,27 @@
 from flask_login import UserMixin
-from app import pyr_auth, pyr_store, pyr_db
-from firebase_admin import auth
-import os
-import tempfile
+from app import pyr_auth, pyr_db, admin_auth, tasks, thread_store
+from app.cache import TTLCache, request_cache
+from app.metrics import propagate_context
+from config import Config
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from uuid import uuid4
+from base64 import b64encode, b64decode
+import io
+import re
+import secrets
 from hashlib import md5
 
+# Shared across requests in this worker, keyed by uid
+user_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL, name='users')
+
+# Admin SDK limit for a single get_users call
+GET_USERS_BATCH_SIZE = 100
+
+# Square jpeg variants made for every profile photo, the largest is the photo_url
+PHOTO_SIZES = [64, 256, 512]
+PHOTO_VARIANT = re.compile(r'%2F(\d+)\.jpg\?alt=media')
+
 class User(UserMixin):
     def __init__(self, uid, email, name, verified, created, photo_url):
         self.id = uid
@@ -16,36 +33,89 @@ class User(UserMixin):
     
     @staticmethod
     def get(user_id):
+        users = request_cache('users')
+
+        # cache plain fields so each caller gets its own User object
+        user_data = users.get(user_id) or user_cache.get(user_id)
+        if user_data:
+            users[user_id] = user_data
+            return User(**user_data)
+
         try:
-            firebase_user = auth.get_user(user_id)
+            firebase_user = admin_auth.get_user(user_id)
             print('Successfully fetched user data: {0}'.format(firebase_user.uid))
-            flask_user = User(
-                uid=firebase_user.uid,
-                email=firebase_user.email,
-                name=firebase_user.display_name,
-                verified=firebase_user.email_verified,
-                created=firebase_user.user_metadata.creation_timestamp,
-                photo_url=firebase_user.photo_url
-            )
-            return flask_user
+            user_data = User._cache_firebase_user(firebase_user)
+
+            return User(**user_data)
         except Exception as e:
             print(e)
             return None
 
+    @staticmethod
+    def get_many(user_ids):
+        users = request_cache('users')
+
+        # returns {uid: User}, users that don't exist are left out
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids): # dedupe, keep order
+            user_data = users.get(user_id) or user_cache.get(user_id)
+            if user_data:
+                users[user_id] = user_data
+                found[user_id] = User(**user_data)
+            else:
+                missing.append(user_id)
+
+        for i in range(0, len(missing), GET_USERS_BATCH_SIZE):
+            chunk = missing[i:i + GET_USERS_BATCH_SIZE]
+            try:
+                result = admin_auth.get_users([admin_auth.UidIdentifier(user_id) for user_id in chunk])
+            except Exception as e:
+                print(e)
+                continue
+
+            for firebase_user in result.users:
+                user_data = User._cache_firebase_user(firebase_user)
+                found[firebase_user.uid] = User(**user_data)
+
+            if result.not_found:
+                print('Users not found: {0}'.format([identifier.uid for identifier in result.not_found]))
+
+        print('Successfully fetched {0} of {1} users'.format(len(found), len(user_ids)))
+        return found
+
+    @staticmethod
+    def _cache_firebase_user(firebase_user):
+        user_data = {
+            "uid": firebase_user.uid,
+            "email": firebase_user.email,
+            "name": firebase_user.display_name,
+            "verified": firebase_user.email_verified,
+            "created": firebase_user.user_metadata.creation_timestamp,
+            "photo_url": firebase_user.photo_url
+        }
+        request_cache('users')[firebase_user.uid] = user_data
+        user_cache.set(firebase_user.uid, user_data)
+
+        return user_data
+
+    @staticmethod
+    def evict(user_id):
+        request_cache('users').pop(user_id, None)
+        user_cache.delete(user_id)
+
     @staticmethod
     def create(name, email, password):
-        firebase_user = auth.create_user(
+        firebase_user = admin_auth.create_user(
             email=email,
             password=password,
             display_name=name
         )
         print('Sucessfully created new user: {0}'.format(firebase_user.uid))
 
-        # send verification
-        pyr_user = pyr_auth.sign_in_with_email_and_password(email, password)
-        pyr_auth.send_email_verification(pyr_user['idToken'])
-
-        print("Sent email verification")
+        # send verification in the background
+        tasks.enqueue('send_email_verification', {"uid": firebase_user.uid},
+            owner=firebase_user.uid, description=f"Verification email to {email}")
 
         flask_user = User(
             uid=firebase_user.uid,
@@ -60,25 +130,25 @@ class User(UserMixin):
     @staticmethod
     def auth(email, password):
         pyr_user = pyr_auth.sign_in_with_email_and_password(email, password)
-        pyr_user_info = pyr_auth.get_account_info(pyr_user['idToken'])
 
-        is_verified = pyr_user_info['users'][0]['emailVerified']
+        # verified locally, the Admin SDK keeps Google's signing keys for as long as their cache-control allows
+        claims = admin_auth.verify_id_token(pyr_user['idToken'])
+        print('Sucessfully signed in user: {0}'.format(claims['uid']))
 
-        # if not is_verified:
-        #     # send verification
-        #     pyr_auth.send_email_verification(pyr_user['idToken'])
-        #     print("Sent email verification")
+        if 'email' not in claims or 'email_verified' not in claims:
+            # not in the token, fall back to the full record
+            firebase_user = admin_auth.get_user(claims['uid'])
+            user_data = User._cache_firebase_user(firebase_user)
+            return User(**user_data)
 
-        firebase_user = auth.get_user(pyr_user['localId'])
-
-        print('Sucessfully signed in user: {0}'.format(pyr_user['localId']))
+        # name and picture are left out of the token when they're not set
         flask_user = User(
-            uid=pyr_user['localId'],
-            email=pyr_user['email'],
-            name=pyr_user['displayName'],
-            verified=is_verified,
-            created=pyr_user_info['users'][0]['createdAt'],
-            photo_url=firebase_user.photo_url
+            uid=claims['uid'],
+            email=claims['email'],
+            name=claims.get('name', pyr_user.get('displayName')),
+            verified=claims['email_verified'],
+            created=None, # not a token claim, view_profile fetches it when it's needed
+            photo_url=claims.get('picture')
         )
         return flask_user
 
@@ -89,7 +159,7 @@ class User(UserMixin):
     def edit(self, name, email, job_title):
         #email change
         if self.email != email:
-            auth.update_user(
+            admin_auth.update_user(
                 self.id,
                 email=email,
                 display_name=name,
@@ -100,13 +170,14 @@ class User(UserMixin):
         
         #just a name or meta change
         else:
-            auth.update_user(
+            admin_auth.update_user(
                 self.id,
                 display_name=name,
             )
         
         self.name = name
         self.set_meta(job_title)
+        User.evict(self.id)
 
     def get_meta(self):
         meta = pyr_db.child('users').child(self.id).get().val()
@@ -118,27 +189,28 @@ class User(UserMixin):
         })
 
     def upload(self, photo):
+        # resize straight from the upload's buffer, no copy on disk
+        variants = resize_photo(photo.stream)
+        folder = 'profiles/{}/{}'.format(self.id, uuid4().hex)
 
-        temp = tempfile.NamedTemporaryFile(delete=False)
-
-        # Save temp image
-        photo.save(temp.name)
+        # stored by a job, so a failed upload is retried and shows on the tasks page
+        return tasks.enqueue('store_photo', {
+            "user_id": self.id,
+            "folder": folder,
+            "variants": {str(size): b64encode(data).decode('ascii') for size, data in variants.items()}
+        }, owner=self.id, description='Upload profile photo')
 
-        pyr_store.child('profiles/{}/{}'.format(self.id, temp.name)).put(temp.name)
+    def photo(self, size):
+        # smallest uploaded variant that covers size, gravatar when there's no photo
+        if not self.photo_url:
+            return self.avatar(size)
 
-        photo_url = pyr_store.child('profiles/{}/{}'.format(self.id, temp.name)).get_url(None)
-
-        auth.update_user(
-            self.id,
-            photo_url=photo_url
-        )
-        self.photo_url = photo_url
+        match = PHOTO_VARIANT.search(self.photo_url)
+        if not match:
+            return self.photo_url # uploaded before variants, full size only
 
-        # Clean-up temp image
-        temp.close()
-        os.remove(temp.name)
-
-        return photo_url
+        variant = next((option for option in PHOTO_SIZES if option >= size), PHOTO_SIZES[-1])
+        return self.photo_url[:match.start(1)] + str(variant) + self.photo_url[match.end(1):]
 
     def avatar(self, size):
         digest = md5(self.email.lower().encode('utf-8')).hexdigest()
@@ -148,7 +220,7 @@ class User(UserMixin):
     @staticmethod
     def get_by_email(email):
         try:
-            firebase_user = auth.get_user_by_email(email)
+            firebase_user = admin_auth.get_user_by_email(email)
 
             print('Successfully fetched user data: {0}'.format(firebase_user.uid))
             flask_user = User(
@@ -166,39 +238,95 @@ class User(UserMixin):
             return None
 
     @staticmethod
-    def invite(email):
-        temp_pass = md5(email.lower().encode('utf-8')).hexdigest()
-
-        # invite and send password reset
-        pyr_user = pyr_auth.create_user_with_email_and_password(email, temp_pass)
-        pyr_auth.send_password_reset_email(email)
+    def get_many_by_email(emails):
+        # returns {lowercase email: User}, batches looked up concurrently
+        emails = list(dict.fromkeys([email.lower() for email in emails]))
+        chunks = [emails[i:i + GET_USERS_BATCH_SIZE] for i in range(0, len(emails), GET_USERS_BATCH_SIZE)]
+        if not chunks:
+            return {}
+
+        def fetch(chunk):
+            try:
+                return admin_auth.get_users([admin_auth.EmailIdentifier(email) for email in chunk]).users
+            except Exception as e:
+                print(e)
+                return []
+
+        with ThreadPoolExecutor(max_workers=min(Config.DB_FETCH_WORKERS, len(chunks))) as executor:
+            results = list(executor.map(propagate_context(fetch), chunks))
+
+        found = {}
+        for firebase_users in results:
+            for firebase_user in firebase_users:
+                user_data = User._cache_firebase_user(firebase_user)
+                found[firebase_user.email.lower()] = User(**user_data)
+
+        print('Successfully fetched {0} of {1} users by email'.format(len(found), len(emails)))
+        return found
 
-        pyr_user_info = pyr_auth.get_account_info(pyr_user['idToken'])
+    @staticmethod
+    def invite(email, invited_by=None):
+        # throwaway password, they set their own from the reset email
+        firebase_user = admin_auth.create_user(email=email, password=secrets.token_urlsafe(24))
+        print('Sucessfully invited new user: {0}'.format(firebase_user.uid))
 
-        print(pyr_user)
-        print(pyr_user_info)
+        tasks.enqueue('send_password_reset_email', {"email": email},
+            owner=invited_by, description=f"Invitation email to {email}")
 
         flask_user = User(
-            uid=pyr_user['localId'],
-            email=pyr_user['email'],
+            uid=firebase_user.uid,
+            email=firebase_user.email,
             name="",
             verified=False,
-            created=pyr_user_info['users'][0]['createdAt'],
+            created=firebase_user.user_metadata.creation_timestamp,
             photo_url=""
         )
         return flask_user
 
     def destroy(self):
-        auth.delete_user(self.id)
+        admin_auth.delete_user(self.id)
+        User.evict(self.id)
         print(f"Deleted user {self.id}")
 
 
-
-
-    
-
-
-
-
-
-
+@tasks.task('send_email_verification')
+def send_email_verification(uid):
+    # sign in as the user with a custom token so no password is stored with the job
+    token = admin_auth.create_custom_token(uid)
+    pyr_user = pyr_auth.sign_in_with_custom_token(token.decode('utf-8'))
+    pyr_auth.send_email_verification(pyr_user['idToken'])
+    print("Sent email verification")
+
+@tasks.task('store_photo')
+def store_photo(user_id, folder, variants):
+    # photo_url only changes once every variant is stored
+    store = thread_store()
+    for size, data in variants.items():
+        store.child('{}/{}.jpg'.format(folder, size)).put(io.BytesIO(b64decode(data)))
+
+    photo_url = store.child('{}/{}.jpg'.format(folder, PHOTO_SIZES[-1])).get_url(None)
+    admin_auth.update_user(
+        user_id,
+        photo_url=photo_url
+    )
+    User.evict(user_id)
+    print('Sucessfully uploaded photo for user: {0}'.format(user_id))
+
+@tasks.task('send_password_reset_email')
+def send_password_reset_email(email):
+    pyr_auth.send_password_reset_email(email)
+    print("Sent password reset")
+
+
+def resize_photo(stream):
+    # {size: jpeg bytes}, center cropped to a square
+    image = Image.open(stream)
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    variants = {}
+    for size in PHOTO_SIZES:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, 'JPEG', quality=85, optimize=True)
+        variants[size] = buffer.getvalue()
+    return variants
@@ -2,8 +2,9 @@ from flask import render_template, flash, redirect, url_for, session, escape, ab
 from flask_login import current_user, login_required, login_user, logout_user
 from app.auth.forms import SignInForm, SignUpForm, ResetPasswordForm, EditProfileForm, UploadPhotoForm
 from app.auth import bp
-from app import login_manager
+from app import login_manager, tasks
 from app.auth.models import User
+from app.auth.snapshot import save_snapshot, clear_snapshot, load_snapshot, revalidate, fresh_user, watch_photo
 
 import requests
 import json
@@ -11,7 +12,8 @@ from datetime import datetime
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(user_id)
+    # from the session cookie while it's fresh, otherwise from Firebase
+    return load_snapshot(user_id) or revalidate(user_id)
 
 @bp.route('/sign_in', methods=['GET', 'POST'])
 def sign_in():
@@ -24,6 +26,7 @@ def sign_in():
         try:
             user = User.auth(email, password)
             login_user(user, remember=True)
+            save_snapshot(user)
 
             # Sign in successful
             flash('User {}, logged in with id={}'.format(
@@ -52,6 +55,7 @@ def sign_up():
         try:
             user = User.create(name, email, password)
             login_user(user, remember=True)
+            save_snapshot(user)
 
             # Sign up successful
             flash('User {}, created with id={}'.format(
@@ -75,6 +79,7 @@ def sign_up():
 def sign_out():
     user_id = current_user.id # save before user logged out
     logout_user()
+    clear_snapshot()
     flash("User {} signed out".format(user_id), 'blue')
     return redirect(url_for("main.index"))
 
@@ -112,6 +117,13 @@ def resend_verification():
 @bp.route('/profile', methods=['GET'])
 @login_required
 def view_profile():
+    if current_user.created is None:
+        # signed in from token claims, the only page that shows it fetches it once
+        user = revalidate(current_user.id)
+        if not user:
+            return redirect(url_for('auth.sign_out'))
+        current_user.created = user.created
+
     meta = current_user.get_meta()
     timestamp = current_user.created
     created_date = datetime.fromtimestamp(timestamp / 1000)
@@ -120,7 +132,29 @@ def view_profile():
     return render_template('auth/view_profile.html',  title='View Profile', meta=meta,
         created_date=format_date)
 
+@bp.route('/profile/tasks', methods=['GET'])
+@login_required
+def view_tasks():
+    jobs = tasks.jobs(current_user.id)
+    for job in jobs:
+        job['created_date'] = datetime.fromtimestamp(job['created_at']).strftime("%b %d %Y %H:%M:%S")
+
+    return render_template('auth/view_tasks.html', title='Background Tasks', jobs=jobs)
+
+@bp.route('/profile/tasks/<int:job_id>/retry', methods=['GET'])
+@login_required
+def retry_task(job_id):
+    if tasks.retry(job_id, current_user.id):
+        flash('Task {} queued again'.format(job_id), 'teal')
+        if tasks.job(job_id)['name'] == 'store_photo':
+            watch_photo(job_id)
+    else:
+        flash("Only failed tasks can be retried", 'orange')
+
+    return redirect(url_for('auth.view_tasks'))
+
 @bp.route('/profile/edit', methods=['GET', 'POST'])
+@fresh_user
 @login_required
 def edit_profile():
     form = EditProfileForm()
@@ -133,6 +167,7 @@ def edit_profile():
         #edit a user
         try:
             current_user.edit(name, email, job_title)
+            save_snapshot(current_user)
 
             # Update successful
             flash('User {}, updated with email={}, name={}, job_title={}'.format(
@@ -158,6 +193,7 @@ def edit_profile():
 
 
 @bp.route('/profile/upload', methods=['GET', 'POST'])
+@fresh_user
 @login_required
 def upload_photo():
     form = UploadPhotoForm()
@@ -165,14 +201,18 @@ def upload_photo():
     if form.validate_on_submit():
         photo = form.photo.data
 
-        #upload an image
+        #upload an image, storage happens in the background
         try:
-            photo_url = current_user.upload(photo)
+            watch_photo(current_user.upload(photo))
 
             # Update successful
-            flash('User {}, updated photo={}'.format(current_user.id, photo_url), 'teal')
+            flash('User {}, photo uploading, it will show up in a few seconds'.format(current_user.id), 'teal')
             return redirect(url_for('auth.view_profile'))
 
+        except IOError:
+            # Pillow couldn't read it
+            flash("Error: That file isn't an image we can read", 'red')
+
         except Exception as e:
             # Update unsuccessful
             error_json = e.args[1]
@@ -0,0 +1,75 @@
+from flask import session, g, flash
+from functools import wraps
+from app import tasks
+from app.auth.models import User
+from config import Config
+import time
+
+# A copy of the signed-in user's fields in the signed session cookie, so
+# load_user only goes to Firebase once the copy is older than USER_SNAPSHOT_TTL
+
+SNAPSHOT_FIELDS = ['uid', 'email', 'name', 'verified', 'created', 'photo_url']
+
+
+def save_snapshot(user, checked=True):
+    snapshot = {field: getattr(user, 'id' if field == 'uid' else field) for field in SNAPSHOT_FIELDS}
+    snapshot['checked_at'] = int(time.time()) if checked else 0
+    session['user'] = snapshot
+
+def clear_snapshot():
+    session.pop('user', None)
+    session.pop('photo_job', None)
+
+def watch_photo(job_id):
+    # the snapshot keeps the old photo until this upload job has finished
+    session['photo_job'] = job_id
+
+def photo_stored():
+    # True once a watched upload is over, the snapshot's photo_url is then out of date
+    job_id = session.get('photo_job')
+    if not job_id:
+        return False
+
+    job = tasks.job(job_id)
+    if job and job['status'] in ['pending', 'running']:
+        return False
+
+    session.pop('photo_job')
+    if job and job['status'] == 'failed':
+        flash("Error: Your photo couldn't be uploaded, you can retry it from Tasks", 'red')
+    return True
+
+def load_snapshot(user_id):
+    snapshot = session.get('user')
+    if not snapshot or snapshot.get('uid') != user_id:
+        return None
+
+    if g.get('revalidate_user'):
+        return None # sensitive route
+
+    if photo_stored():
+        return None # new photo_url
+
+    if time.time() - snapshot.get('checked_at', 0) > Config.USER_SNAPSHOT_TTL:
+        return None
+
+    return User(**{field: snapshot.get(field) for field in SNAPSHOT_FIELDS})
+
+def revalidate(user_id):
+    # straight from Firebase, a disabled or deleted account signs out here
+    User.evict(user_id)
+    user = User.get(user_id)
+
+    if user:
+        save_snapshot(user)
+    else:
+        clear_snapshot()
+    return user
+
+def fresh_user(view):
+    # put above @login_required so current_user is checked against Firebase first
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.revalidate_user = True
+        return view(*args, **kwargs)
+    return wrapper
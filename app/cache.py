@@ -0,0 +1,96 @@
+from flask import g, has_request_context
+from collections import OrderedDict
+import threading
+import time
+
+
+# Named caches, their stats are exported on /metrics
+caches = {}
+
+
+class TTLCache():
+    def __init__(self, maxsize, ttl, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict() # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+
+        if name:
+            caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key) # least recently used goes first
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize
+            }
+
+
+class Versions():
+    # Counters bumped by writes, pages record the ones they were built from
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def current(self, keys):
+        with self._lock:
+            return {key: self._counters.get(key, 0) for key in keys}
+
+
+# Shared across requests in this worker, keyed by ('team', id) or ('user', id)
+versions = Versions()
+
+
+def request_cache(name):
+    # Dict that lives on flask.g for the current request only
+    if not has_request_context():
+        return {}
+
+    caches = g.setdefault('_request_caches', {})
+    return caches.setdefault(name, {})
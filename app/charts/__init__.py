@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('charts', __name__)
 
-from app.charts import routes
\ No newline at end of file
+from app.charts import routes, commands
\ No newline at end of file
@@ -0,0 +1,76 @@
+import numpy as np
+
+METRICS = ['spend', 'clicks', 'impressions', 'conversions']
+
+
+class InsightColumns():
+    # Insight rows parsed once into float arrays, one per metric
+    def __init__(self, dates, columns):
+        self.dates = dates
+        self.columns = columns
+
+    @staticmethod
+    def from_rows(rows):
+        dates = [row['date'] for row in rows]
+        columns = {}
+        for metric in METRICS:
+            columns[metric] = np.array([row.get(metric) or 0 for row in rows], dtype=float)
+        return InsightColumns(dates, columns)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def split(self, date):
+        # rows before date, rows from date on
+        index = int(np.searchsorted(np.array(self.dates, dtype='datetime64[D]'), np.datetime64(date)))
+        before = InsightColumns(self.dates[:index], {metric: values[:index] for metric, values in self.columns.items()})
+        after = InsightColumns(self.dates[index:], {metric: values[index:] for metric, values in self.columns.items()})
+        return before, after
+
+    def cpa(self):
+        spend = self.columns['spend']
+        conversions = self.columns['conversions']
+        return np.divide(spend, conversions, out=np.zeros_like(spend), where=conversions != 0)
+
+    def totals(self):
+        totals = {metric: round(float(values.sum()), 2) for metric, values in self.columns.items()}
+        if totals['conversions']:
+            totals['cpa'] = round(totals['spend'] / totals['conversions'], 2)
+        else:
+            totals['cpa'] = 0
+        return totals
+
+    def deltas(self, previous):
+        # percent change against the previous period, None where it had nothing
+        current_totals = self.totals()
+        previous_totals = previous.totals()
+
+        deltas = {}
+        for metric, value in current_totals.items():
+            if previous_totals[metric]:
+                deltas[metric] = round((value - previous_totals[metric]) / previous_totals[metric] * 100, 1)
+            else:
+                deltas[metric] = None
+        return deltas
+
+    def series(self, window=7):
+        series = {"labels": self.dates}
+        for metric, values in self.columns.items():
+            series[metric] = np.round(values, 2).tolist()
+
+        cpa = self.cpa()
+        series['cpa'] = np.round(cpa, 2).tolist()
+        series['spend_rolling'] = np.round(rolling_mean(self.columns['spend'], window), 2).tolist()
+        series['cpa_rolling'] = np.round(rolling_mean(cpa, window), 2).tolist()
+        return series
+
+
+def rolling_mean(values, window):
+    # trailing mean, the first few points average over what's there
+    if not len(values):
+        return values
+
+    sums = np.cumsum(np.insert(values, 0, 0.0))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    starts = np.arange(1, len(values) + 1) - counts
+    return (sums[1:] - sums[starts]) / counts
@@ -0,0 +1,9 @@
+import click
+from app.charts import bp
+from app.charts.insights import ingest_all
+
+@bp.cli.command('ingest')
+@click.option('--days', default=2, help='Days back to ingest, 2 is yesterday and today')
+def ingest(days):
+    # flask charts ingest
+    ingest_all(days)
@@ -0,0 +1,205 @@
+from app import http, thread_db, tasks
+from app.cache import TTLCache
+from app.metrics import propagate_context
+from app.teams.models import Team
+from config import Config
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+# One entry per (function, team, account_id, conversion_event, day). Scoped to the team,
+# so a team that sets another team's account_id doesn't get its cached days
+insights_cache = TTLCache(maxsize=Config.INSIGHTS_CACHE_SIZE, ttl=Config.INSIGHTS_CACHE_TTL, name='insights')
+
+
+def fetch_insights(function_name, payload, deadline=None):
+    url = f"https://us-central1-{Config.DB['projectId']}.cloudfunctions.net/{function_name}"
+
+    # deadline is a time.monotonic() the caller stops waiting at, don't read past it
+    timeout = http.timeout
+    if deadline:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('Deadline passed before fetching insights')
+        timeout = (http.timeout[0], min(http.timeout[1], remaining))
+
+    response = http.get(url, params=payload, timeout=timeout)
+    data = json.loads(response.text)
+    return data
+
+
+def cache_key(function_name, team_id, account_id, conversion_event, day):
+    return (function_name, team_id, account_id, conversion_event, day)
+
+
+def get_insights(function_name, payload, team_id, rollups=False, deadline=None):
+    days = date_range(payload['date_start'], payload['date_end'])
+
+    # days are in the ad account's timezone, so server yesterday can still be partial
+    recent = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def day_key(day):
+        return cache_key(function_name, team_id, payload['account_id'], payload.get('conversion_event'), day)
+
+    def keep(day, row):
+        ttl = Config.INSIGHTS_TODAY_TTL if day >= recent else None
+        insights_cache.set(day_key(day), row, ttl=ttl)
+        rows[day] = row
+
+    rows = {}
+    missing = []
+    for day in days:
+        row = insights_cache.get(day_key(day))
+        if row is None:
+            missing.append(day)
+        else:
+            rows[day] = row
+
+    # then the ingested rollups for the team
+    if rollups and missing:
+        team_rollups = read_rollups(team_id, missing[0], missing[-1])
+
+        for day in list(missing):
+            rollup = team_rollups.get(day)
+            if rollup and matches(rollup, payload):
+                keep(day, rollup_row(rollup))
+                missing.remove(day)
+
+    # only ask the cloud function for the days we don't have
+    for start, end in contiguous_ranges(missing):
+        data = fetch_insights(function_name, dict(payload, date_start=start, date_end=end), deadline=deadline)
+        fetched = {row['date']: row for row in data}
+
+        for day in date_range(start, end):
+            keep(day, fetched.get(day, {})) # days without delivery come back missing
+
+    data = [rows[day] for day in days if rows[day]]
+    return data
+
+
+def read_rollups(team_id, start_date, end_date):
+    # called from the portfolio's thread pool, so not the shared pyr_db
+    rollups = thread_db().child('rollups').child(team_id).order_by_key().start_at(start_date).end_at(end_date).get().val()
+    return rollups or {}
+
+
+def matches(rollup, payload):
+    # rollups are per team, the team may have moved to another account or event since
+    return (rollup.get('account_id') == payload['account_id']
+        and rollup.get('conversion_event') == payload.get('conversion_event'))
+
+
+def rollup_row(rollup):
+    if rollup.get('empty'):
+        return {}
+    return {key: rollup[key] for key in ['date', 'impressions', 'clicks', 'spend', 'conversions']}
+
+
+def ingest_team(team, days=2):
+    # Pull the last few days (yesterday and today by default) into rollups/{team_id}/{day}
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=days - 1)
+
+    payload = {
+        "access_token": team.facebook_token,
+        "account_id": team.account_id,
+        "date_start": start_date.strftime('%Y-%m-%d'),
+        "date_end": end_date.strftime('%Y-%m-%d'),
+        "conversion_event": team.conversion_event
+        }
+    data = fetch_insights('get_facebook_data', payload)
+    fetched = {row['date']: row for row in data}
+
+    updated_at = datetime.utcnow().isoformat()
+    rollups = {}
+    for day in date_range(payload['date_start'], payload['date_end']):
+        rollup = dict(fetched.get(day) or {"date": day, "empty": True})
+        rollup['account_id'] = team.account_id
+        rollup['conversion_event'] = team.conversion_event
+        rollup['updated_at'] = updated_at
+        rollups[f"rollups/{team.id}/{day}"] = rollup
+
+        # this worker's cached copy is now stale
+        insights_cache.delete(cache_key('get_facebook_data', team.id, team.account_id, team.conversion_event, day))
+
+    thread_db().update(rollups)
+    print('Sucessfully ingested {0} days for team {1}'.format(len(rollups), team.id))
+
+    return len(rollups)
+
+
+def ingestable_teams():
+    teams_data = thread_db().child('teams').get().each() or []
+    teams = [Team.from_data(team.key(), team.val()) for team in teams_data]
+    return [team for team in teams if team.facebook_token and team.account_id and team.conversion_event]
+
+
+def queue_ingest(days=2):
+    # a job per team, so the cron request returns long before gunicorn's timeout
+    teams = ingestable_teams()
+    for team in teams:
+        tasks.enqueue('ingest_team', {"team_id": team.id, "days": days}, description=f'Ingest {team.name}')
+
+    summary = {"teams": len(teams), "queued": len(teams)}
+    print('Ingest queued: {0}'.format(summary))
+
+    return summary
+
+
+@tasks.task('ingest_team')
+def ingest_team_job(team_id, days):
+    # task threads run beside the request thread, Team.get would use the shared pyr_db
+    team_data = thread_db().child('teams').child(team_id).get().val()
+    if not team_data:
+        print(f'Team {team_id} no longer exists, nothing to ingest')
+        return
+
+    ingest_team(Team.from_data(team_id, team_data), days) # failures are retried by the queue
+
+
+def ingest_all(days=2):
+    teams = ingestable_teams()
+
+    def ingest(team):
+        try:
+            return ingest_team(team, days)
+        except Exception as e:
+            print(f"Ingest failed for team {team.id}: {e}")
+            return None
+
+    results = []
+    if teams:
+        with ThreadPoolExecutor(max_workers=min(Config.INGEST_WORKERS, len(teams))) as executor:
+            results = list(executor.map(propagate_context(ingest), teams))
+
+    summary = {
+        "teams": len(teams),
+        "days": sum([result for result in results if result]),
+        "errors": len([result for result in results if result is None])
+    }
+    print('Ingest finished: {0}'.format(summary))
+
+    return summary
+
+
+def date_range(start_date, end_date):
+    s_date = datetime.strptime(start_date, '%Y-%m-%d')
+    e_date = datetime.strptime(end_date, '%Y-%m-%d')
+
+    days = []
+    for d in range((e_date - s_date).days + 1):
+        days.append((s_date + timedelta(days=d)).strftime('%Y-%m-%d'))
+    return days
+
+
+def contiguous_ranges(days):
+    # ['2020-01-01', '2020-01-02', '2020-01-05'] -> [('2020-01-01', '2020-01-02'), ('2020-01-05', '2020-01-05')]
+    ranges = []
+    for day in days:
+        previous = (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        if ranges and ranges[-1][1] == previous:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
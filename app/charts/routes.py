@@ -1,24 +1,28 @@
-from flask import render_template, request, flash, redirect, url_for, session, abort
-from flask_login import login_required
+from flask import render_template, request, flash, redirect, url_for, session, abort, jsonify
+from flask_login import login_required, current_user
 from app.charts import bp
-import json
-import requests
 from config import Config
 from app.charts.forms import DateForm
-from app.teams.models import Team
+from app.charts.insights import get_insights, queue_ingest
+from app.charts.columns import InsightColumns
+from app.metrics import propagate_context
+from app.teams.models import Team, Membership
 from datetime import timedelta, datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+import time
 
-@bp.route('/', methods=['GET', 'POST'])
-@login_required
-def dashboard():
-    form = DateForm()
+def default_dates():
+    yesterday = datetime.today() - timedelta(days=1)
+    week_ago = yesterday - timedelta(days=6)
+    return week_ago, yesterday
+
+def form_dates(form):
     if form.validate_on_submit():
         start_date = form.start_date.data.strftime('%Y-%m-%d')
         end_date = form.end_date.data.strftime('%Y-%m-%d')
         print(start_date, end_date)
     else:
-        yesterday = datetime.today() - timedelta(days=1)
-        week_ago = yesterday - timedelta(days=6)
+        week_ago, yesterday = default_dates()
 
         form.start_date.data = week_ago
         form.end_date.data = yesterday
@@ -26,6 +30,61 @@ def dashboard():
         start_date = week_ago.strftime('%Y-%m-%d')
         end_date = yesterday.strftime('%Y-%m-%d')
 
+    return start_date, end_date
+
+def team_insights(source, team, start_date, end_date, compare=True, deadline=None):
+    # Run the cloud function
+    if source == 'facebook':
+        function_name = 'get_facebook_data'
+        payload = {
+            "access_token": team.facebook_token,
+            "account_id": team.account_id,
+            "date_start": start_date,
+            "date_end": end_date,
+            "conversion_event": team.conversion_event
+            }
+    else:
+        function_name = 'get_test_data'
+        payload = {
+            "access_token": Config.ACCESS_TOKEN,
+            "account_id": team.account_id,
+            "date_start": start_date,
+            "date_end": end_date
+            }
+
+    if compare:
+        # fetch the previous period of the same length in the same call
+        s_date = datetime.strptime(start_date, '%Y-%m-%d')
+        e_date = datetime.strptime(end_date, '%Y-%m-%d')
+        previous_start = s_date - timedelta(days=(e_date - s_date).days + 1)
+        payload['date_start'] = previous_start.strftime('%Y-%m-%d')
+
+    if source == 'facebook':
+        # ingested rollups first, live fetch only for the gaps
+        data = get_insights(function_name, payload, team.id, rollups=True, deadline=deadline)
+    else:
+        data = get_insights(function_name, payload, team.id, deadline=deadline)
+    previous, current = InsightColumns.from_rows(data).split(start_date)
+
+    totals = current.totals()
+    insights = {
+        "spend": totals['spend'],
+        "conversions": totals['conversions'],
+        "cpa": totals['cpa'],
+        "totals": totals
+    }
+    if compare:
+        insights['deltas'] = current.deltas(previous)
+        insights['series'] = current.series()
+
+    return insights
+
+@bp.route('/', methods=['GET', 'POST'])
+@login_required
+def dashboard():
+    form = DateForm()
+    start_date, end_date = form_dates(form)
+
     if not session.get('team_id'):
         # No team selected
         flash("Please select a team", 'orange')
@@ -38,39 +97,17 @@ def dashboard():
             # No account id for team
             flash("Please ask account owner to update Account ID", 'orange')
             return redirect(url_for('teams.edit_team', team_id=team.id))
-    
-    # Run the cloud function
-    url = f"https://us-central1-{Config.DB['projectId']}.cloudfunctions.net/get_test_data"
-    payload = {
-        "access_token": Config.ACCESS_TOKEN,
-        "account_id": account_id,
-        "date_start": start_date,
-        "date_end": end_date
-        }
-    response = requests.get(url, params=payload)
-    data = json.loads(response.text)
 
-    spend = sum([float(row['spend']) for row in data])
+    # Chart data is loaded from the insights api once the page is up
+    insights_url = url_for('charts.insights', source='test', date_start=start_date, date_end=end_date)
 
-    return render_template('charts/dashboard.html', title='Dashboard', data=data, spend=spend, form=form, account_id=account_id)
+    return render_template('charts/dashboard.html', title='Dashboard', insights_url=insights_url, form=form, account_id=account_id)
 
 @bp.route('/facebook', methods=['GET', 'POST'])
 @login_required
 def facebook_dashboard():
     form = DateForm()
-    if form.validate_on_submit():
-        start_date = form.start_date.data.strftime('%Y-%m-%d')
-        end_date = form.end_date.data.strftime('%Y-%m-%d')
-        print(start_date, end_date)
-    else:
-        yesterday = datetime.today() - timedelta(days=1)
-        week_ago = yesterday - timedelta(days=6)
-
-        form.start_date.data = week_ago
-        form.end_date.data = yesterday
-
-        start_date = week_ago.strftime('%Y-%m-%d')
-        end_date = yesterday.strftime('%Y-%m-%d')
+    start_date, end_date = form_dates(form)
 
     if not session.get('team_id'):
         # No team selected
@@ -85,45 +122,137 @@ def facebook_dashboard():
             # No account id for team
             flash("Please ask account owner to update Account ID", 'orange')
             return redirect(url_for('teams.edit_team', team_id=team.id))
-        
+
         if not conversion_event:
             # No account id for team
             flash("Please ask account owner to update Conversion Event", 'orange')
             return redirect(url_for('teams.edit_team', team_id=team.id))
-    
-    # Run the cloud function
+
+    # Chart data is loaded from the insights api once the page is up
+    insights_url = url_for('charts.insights', source='facebook', date_start=start_date, date_end=end_date)
+
+    return render_template(
+        'charts/facebook_dashboard.html',
+        title='Facebook Dashboard',
+        insights_url=insights_url,
+        form=form,
+        account_id=account_id
+    )
+
+@bp.route('/api/insights', methods=['GET'])
+@login_required
+def insights():
+    source = request.args.get('source', 'test')
+    week_ago, yesterday = default_dates()
+    start_date = request.args.get('date_start', week_ago.strftime('%Y-%m-%d'))
+    end_date = request.args.get('date_end', yesterday.strftime('%Y-%m-%d'))
+
     try:
-        url = f"https://us-central1-{Config.DB['projectId']}.cloudfunctions.net/get_facebook_data"
-        payload = {
-            "access_token": team.facebook_token,
-            "account_id": account_id,
-            "date_start": start_date,
-            "date_end": end_date,
-            "conversion_event": conversion_event
-            }
-        response = requests.get(url, params=payload)
-        data = json.loads(response.text)
+        if datetime.strptime(start_date, '%Y-%m-%d') > datetime.strptime(end_date, '%Y-%m-%d'):
+            raise ValueError("date_start is after date_end")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not session.get('team_id'):
+        return jsonify({"error": "Please select a team"}), 400
+
+    team = Team.get(session.get('team_id'))
+
+    if not team.account_id:
+        return jsonify({"error": "Please ask account owner to update Account ID"}), 400
+
+    if source == 'facebook' and not team.conversion_event:
+        return jsonify({"error": "Please ask account owner to update Conversion Event"}), 400
+
+    try:
+        insights = team_insights(source, team, start_date, end_date)
     except Exception as e:
-         # No account id for team
-        flash(f"Error: {e}", 'red')
-        flash("Make sure Account ID, Conversion Event are correct", 'orange')
-        return redirect(url_for('teams.edit_team', team_id=team.id))
-    
-
-    spend = sum([float(row['spend']) for row in data])
-    conversions = sum([float(row['conversions']) for row in data])
+        print(e)
+        return jsonify({"error": f"{e}. Make sure Account ID, Conversion Event are correct"}), 502
+
+    return jsonify(insights)
+
+@bp.route('/portfolio', methods=['GET', 'POST'])
+@login_required
+def portfolio():
+    form = DateForm()
+    start_date, end_date = form_dates(form)
+
+    teams_by_user = Membership.get_teams_by_user(current_user.id)
+    teams = Team.get_many([membership.val()['team_id'] for membership in teams_by_user])
+
+    portfolio_teams = []
+    for team in teams:
+        if not team:
+            continue
+
+        if team.account_id and team.conversion_event and team.facebook_token:
+            status = 'pending'
+        else:
+            status = 'not connected'
+
+        portfolio_teams.append({
+            "id": team.id,
+            "name": team.name,
+            "team": team,
+            "status": status,
+            "spend": 0,
+            "conversions": 0,
+            "cpa": 0
+        })
+
+    # Fetch every team at once, whatever isn't back by the deadline is partial
+    pending = [row for row in portfolio_teams if row['status'] == 'pending']
+    if pending:
+        # fetches still running at the deadline time out on their own rather than holding a connection
+        deadline = time.monotonic() + Config.PORTFOLIO_DEADLINE
+        executor = ThreadPoolExecutor(max_workers=min(Config.PORTFOLIO_WORKERS, len(pending)))
+        fetch = propagate_context(team_insights)
+        futures = {executor.submit(fetch, 'facebook', row['team'], start_date, end_date, compare=False, deadline=deadline): row for row in pending}
+        done, not_done = wait(futures, timeout=Config.PORTFOLIO_DEADLINE)
+        executor.shutdown(wait=False)
+
+        for future, row in futures.items():
+            if future in not_done:
+                future.cancel()
+                row['status'] = 'partial'
+            elif future.exception():
+                print(future.exception())
+                row['status'] = 'error'
+            else:
+                results = future.result()
+                row['status'] = 'ok'
+                row['spend'] = results['spend']
+                row['conversions'] = results['conversions']
+                row['cpa'] = results['cpa']
+
+    spend = sum([row['spend'] for row in portfolio_teams])
+    conversions = sum([row['conversions'] for row in portfolio_teams])
     if conversions:
         cpa = round(spend / conversions, 2)
     else:
         cpa = 0
 
+    partial = any([row['status'] in ['partial', 'error'] for row in portfolio_teams])
+    if partial:
+        flash("Some teams didn't load in time, totals are partial", 'orange')
+
     return render_template(
-        'charts/facebook_dashboard.html', 
-        title='Facebook Dashboard', 
-        data=data, 
+        'charts/portfolio.html',
+        title='Portfolio',
+        portfolio_teams=portfolio_teams,
         spend=spend,
         conversions=conversions,
-        cpa=cpa, 
-        form=form, 
-        account_id=account_id
-    )
\ No newline at end of file
+        cpa=cpa,
+        partial=partial,
+        form=form
+    )
+
+@bp.route('/ingest', methods=['GET'])
+def ingest():
+    # App Engine strips this header from outside requests, so only cron can send it
+    if request.headers.get('X-Appengine-Cron') != 'true':
+        abort(403)
+
+    summary = queue_ingest()
+    return jsonify(summary)
@@ -1,9 +1,9 @@
 from flask import render_template, session, flash, redirect, url_for, request
 from flask_login import login_required, current_user
+from app import http
 from app.connectors import bp
 from app.teams.models import Team
 from config import Config
-import requests
 import json
 
 @bp.route('/', methods=['GET'])
@@ -57,7 +57,7 @@ def callback(platform):
         print("trying url: ", token_url)
 
         # Get the temp token
-        temp_token_response = requests.post(token_url)
+        temp_token_response = http.post(token_url)
 
         # Parse the temp token
         print("temp token dump:", json.dumps(temp_token_response.json()))
@@ -73,7 +73,7 @@ def callback(platform):
         exchange_url = Config.CONNECTORS['facebook_token_endpoint'] + grant_param + client_param + secret_param + token_param
 
         # Get the token
-        token_response = requests.post(exchange_url)
+        token_response = http.post(exchange_url)
 
         # Parse the token
         print("token dump:", json.dumps(token_response.json()))
@@ -0,0 +1,34 @@
+import os
+import threading
+import weakref
+
+
+class PerProcess():
+    # A value built on first use, once per process. Threads and network clients
+    # don't survive a gunicorn fork, so a forked child builds its own on first use
+    def __init__(self, factory, discard=None):
+        self.factory = factory
+        self.discard = discard # called in the child with the parent's value, if it had one
+        self._reset()
+
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._after_fork())
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self.factory()
+                    self._built = True
+        return self._value
+
+    def _reset(self):
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock() # could have been held by a thread that's gone
+
+    def _after_fork(self):
+        inherited = self._value if self._built else None
+        self._reset()
+        if inherited is not None and self.discard:
+            self.discard(inherited)
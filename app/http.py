@@ -0,0 +1,51 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.metrics import timed
+
+
+class HttpClient():
+    def __init__(self, app=None):
+        self.session = None
+        self.timeout = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # one pooled session per worker, built when the app is created
+        # connect errors and gateway errors are retried, but not read timeouts, another
+        # full read would go past gunicorn's timeout. The cloud functions answer 500
+        # for bad input (a wrong account id), asking again only repeats the same error
+        retry = Retry(
+            total=app.config['HTTP_RETRIES'],
+            read=0,
+            backoff_factor=app.config['HTTP_BACKOFF'],
+            status_forcelist=[502, 503, 504],
+            method_whitelist=frozenset(['GET', 'HEAD']), # only retry idempotent calls
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=app.config['HTTP_POOL_SIZE'],
+            pool_maxsize=app.config['HTTP_POOL_SIZE'],
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        self.session = session
+        self.timeout = (app.config['HTTP_CONNECT_TIMEOUT'], app.config['HTTP_READ_TIMEOUT'])
+        app.extensions['http'] = self
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with timed('http'):
+            return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
@@ -0,0 +1,186 @@
+from flask import request, Response, current_app, abort
+import hmac
+from app.cache import caches
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+# Remote call timing per request, exposed as Server-Timing and /metrics
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100, 200]
+
+# Methods that go over the network, everything else (child, order_by_child...) is local
+REMOTE_METHODS = {
+    'pyr_db': {'get', 'set', 'push', 'update', 'remove', 'stream'},
+    'pyr_store': {'put', 'download', 'delete', 'list_files'},
+    'pyr_auth': None, # every call
+    'admin_auth': {'get_user', 'get_users', 'get_user_by_email', 'create_user',
+        'update_user', 'delete_user', 'verify_id_token', 'list_users', 'set_custom_user_claims'},
+}
+
+# Backends counted on every request, http is timed by app.http
+BACKENDS = list(REMOTE_METHODS) + ['http']
+
+_recorder = contextvars.ContextVar('remote_calls', default=None)
+
+
+class Histogram():
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {} # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._series.items()):
+                labels = ','.join(f'{key}="{value}"' for key, value in zip(self.labels, label_values))
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return '\n'.join(lines)
+
+
+request_duration = Histogram('fireflask_request_duration_seconds',
+    'Time to handle a request.', ['route'], DURATION_BUCKETS)
+remote_call_duration = Histogram('fireflask_remote_call_duration_seconds',
+    'Time spent in one remote call.', ['route', 'backend'], DURATION_BUCKETS)
+remote_calls_per_request = Histogram('fireflask_remote_calls_per_request',
+    'Remote calls made while handling one request.', ['route', 'backend'], COUNT_BUCKETS)
+
+HISTOGRAMS = [request_duration, remote_call_duration, remote_calls_per_request]
+
+
+class Recorder():
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.calls = {} # backend -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, backend, seconds):
+        with self._lock:
+            call = self.calls.setdefault(backend, [0, 0.0])
+            call[0] += 1
+            call[1] += seconds
+        remote_call_duration.observe(seconds, self.route, backend)
+
+
+@contextmanager
+def timed(backend):
+    recorder = _recorder.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recorder:
+            recorder.add(backend, time.perf_counter() - start)
+
+
+class Instrumented():
+    # Wraps a client and times its remote methods, chained calls get the wrapper back
+    def __init__(self, backend, client):
+        self._backend = backend
+        self._client = client
+        self._remote = REMOTE_METHODS.get(backend)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+
+        def call(*args, **kwargs):
+            if self._remote is None or name in self._remote:
+                with timed(self._backend):
+                    result = attr(*args, **kwargs)
+            else:
+                result = attr(*args, **kwargs)
+
+            if result is self._client:
+                return self
+            return result
+        return call
+
+
+def propagate_context(fn):
+    # Thread pool tasks don't inherit contextvars, carry the request's along
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def before_request():
+    _recorder.set(Recorder(request.endpoint or 'unknown'))
+
+def after_request(response):
+    recorder = _recorder.get()
+    if recorder is None or request.endpoint == 'static':
+        return response
+
+    total = time.perf_counter() - recorder.start
+    request_duration.observe(total, recorder.route)
+
+    # requests that made no calls count too, they're the le="0" bucket
+    for backend in BACKENDS:
+        remote_calls_per_request.observe(recorder.calls.get(backend, [0])[0], recorder.route, backend)
+
+    timings = []
+    for backend, (count, seconds) in sorted(recorder.calls.items()):
+        timings.append(f'{backend};desc="{backend} x{count}";dur={seconds * 1000:.1f}')
+    timings.append(f'total;dur={total * 1000:.1f}')
+
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+def teardown_request(exc):
+    _recorder.set(None)
+
+def render_caches():
+    lines = []
+    for name, kind, description, field in [
+        ('fireflask_cache_hits_total', 'counter', 'Cache lookups that found a live entry.', 'hits'),
+        ('fireflask_cache_misses_total', 'counter', 'Cache lookups that found nothing or an expired entry.', 'misses'),
+        ('fireflask_cache_entries', 'gauge', 'Entries held in the cache.', 'size')
+    ]:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for cache_name, cache in sorted(caches.items()):
+            lines.append(f'{name}{{cache="{cache_name}"}} {cache.stats()[field]}')
+    return '\n'.join(lines)
+
+def metrics():
+    # with METRICS_TOKEN set, scrapers send it as a bearer token
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+
+    body = '\n'.join([histogram.render() for histogram in HISTOGRAMS] + [render_caches()]) + '\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+
+    if app.config.get('METRICS_ENDPOINT'):
+        app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,49 @@
+from flask import request, session, make_response
+from flask_login import current_user
+from app.cache import TTLCache, versions
+from config import Config
+from hashlib import md5
+
+# Rendered pages per user, reused while the versions they were built from
+# haven't moved. Writes in other workers only show up after PAGE_CACHE_TTL
+page_cache = TTLCache(maxsize=Config.PAGE_CACHE_SIZE, ttl=Config.PAGE_CACHE_TTL, name='pages')
+
+
+class Page():
+    def __init__(self, *key):
+        # the nav shows the selected team, so that's part of the key too
+        self.key = (request.endpoint, current_user.id, session.get('team_id'), session.get('team_name')) + key
+        self.versions = {}
+        self.cacheable = not session.get('_flashes') # flashed messages only render once
+
+    def cached(self):
+        if not self.cacheable:
+            return None
+
+        page = page_cache.get(self.key)
+        if page and versions.current(page['versions'].keys()) == page['versions']:
+            return self.response(page)
+        return None
+
+    def depends_on(self, *keys):
+        # call before reading, so a write part way through leaves the page stale
+        self.versions.update(versions.current(keys))
+
+    def render(self, html, **session_values):
+        page = {
+            "html": html,
+            "etag": md5(html.encode('utf-8')).hexdigest(),
+            "versions": self.versions,
+            "session": session_values
+        }
+        if self.cacheable:
+            page_cache.set(self.key, page)
+        return self.response(page)
+
+    def response(self, page):
+        session.update(page['session'])
+
+        response = make_response(page['html'])
+        response.set_etag(page['etag'])
+        response.headers['Cache-Control'] = 'private, no-cache' # always ask, 304 when it's the same
+        return response.make_conditional(request)
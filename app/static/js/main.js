@@ -2,4 +2,42 @@ $(document).ready(function () {
     $(".dropdown-trigger").dropdown();
     $('select').formSelect();
     $('.datepicker').datepicker();
-})
\ No newline at end of file
+})
+
+// Chart partials push a function here to draw themselves once data arrives
+var chartRenderers = [];
+
+function formatMetric(value, format) {
+    value = parseFloat(value) || 0;
+    if (format == 'currency') {
+        return '$' + value.toLocaleString('en-US', {maximumFractionDigits: 0});
+    } else if (format == 'currency2') {
+        return '$' + value.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    }
+    return value.toLocaleString('en-US', {maximumFractionDigits: 0});
+}
+
+function loadInsights(url) {
+    $.getJSON(url)
+        .done(function (insights) {
+            $('[data-metric]').each(function () {
+                $(this).text(formatMetric(insights[$(this).data('metric')], $(this).data('format')));
+            });
+            $('[data-delta]').each(function () {
+                var delta = insights.deltas[$(this).data('delta')];
+                if (delta !== null && delta !== undefined) {
+                    $(this).text((delta > 0 ? '+' : '') + delta + '% vs previous period');
+                }
+            });
+            for (var i=0; i<chartRenderers.length; i++) {
+                chartRenderers[i](insights.series);
+            }
+        })
+        .fail(function (xhr) {
+            var error = (xhr.responseJSON && xhr.responseJSON.error) || xhr.statusText;
+            M.toast({html: 'Error: ' + error, classes: 'red'});
+        })
+        .always(function () {
+            $('#insightsLoader').hide();
+        });
+}
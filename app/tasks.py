@@ -0,0 +1,191 @@
+from config import Config
+from app.forks import PerProcess
+from contextlib import closing
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+
+class TaskQueue():
+    # Side effects that shouldn't hold up a request (emails mostly), run by a
+    # small pool of worker threads. Jobs are kept in a local sqlite table so
+    # they survive a restart and can be retried and looked at afterwards
+    def __init__(self, app=None):
+        self.handlers = {}
+        self._threads = PerProcess(self._spawn)
+        self._table = None
+        self._wake = threading.Event()
+
+        # usable before create_app, models enqueue outside of an app too
+        self.configure(vars(Config))
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(app.config)
+        app.extensions['tasks'] = self
+        self._start()
+
+    def configure(self, config):
+        self.path = config['TASKS_DB']
+        self.workers = config['TASK_WORKERS']
+        self.max_attempts = config['TASK_MAX_ATTEMPTS']
+        self.backoff = config['TASK_BACKOFF']
+        self.timeout = config['TASK_TIMEOUT']
+
+    def _create_table(self, db):
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                args TEXT NOT NULL,
+                owner TEXT,
+                description TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                run_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, run_at)')
+        db.execute('CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, id)')
+
+    def task(self, name):
+        def register(fn):
+            self.handlers[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, args, owner=None, description=None):
+        # owner is the user the job is shown to on the status page
+        now = time.time()
+        with self._connect() as db:
+            job_id = db.execute(
+                'INSERT INTO jobs (name, args, owner, description, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, json.dumps(args), owner, description, now, now, now)
+            ).lastrowid
+
+        print('Queued job {0} {1}'.format(job_id, name))
+        self._start()
+        self._wake.set()
+        return job_id
+
+    def jobs(self, owner, limit=50):
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT * FROM jobs WHERE owner = ? ORDER BY id DESC LIMIT ?', (owner, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def job(self, job_id):
+        with self._connect() as db:
+            row = db.execute('SELECT id, name, owner, status, attempts, last_error FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def pending(self):
+        # jobs still to run or running, across every process using the table
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    def retry(self, job_id, owner):
+        # failed jobs can be sent round again from the status page
+        with self._connect() as db:
+            retried = db.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = 'failed'",
+                (time.time(), time.time(), job_id, owner)
+            ).rowcount
+
+        self._wake.set()
+        return bool(retried)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        db.row_factory = sqlite3.Row
+
+        # the table is made on first use of each path
+        if self._table != self.path:
+            self._create_table(db)
+            self._table = self.path
+        return closing(db)
+
+    def _start(self):
+        if self.workers:
+            self._threads.get()
+
+    def _spawn(self):
+        threads = [threading.Thread(target=self._work, name=f'tasks-{i}', daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _claim(self):
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            # jobs left running by a worker that died are picked up again
+            row = db.execute(
+                "SELECT * FROM jobs WHERE (status = 'pending' AND run_at <= ?) OR (status = 'running' AND updated_at <= ?) ORDER BY run_at LIMIT 1",
+                (now, now - self.timeout)
+            ).fetchone()
+
+            if row:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row['id'])
+                )
+            db.execute('COMMIT')
+
+        if row:
+            job = dict(row)
+            job['attempts'] += 1
+            return job
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(e)
+                job = None
+
+            if job is None:
+                # other processes add jobs too, so don't rely on the event alone
+                self._wake.wait(timeout=1)
+                self._wake.clear()
+                continue
+
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            handler = self.handlers[job['name']]
+            handler(**json.loads(job['args']))
+        except Exception as e:
+            print('Job {0} {1} failed: {2}'.format(job['id'], job['name'], e))
+            error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+
+            if job['attempts'] < self.max_attempts:
+                status = 'pending'
+                run_at = time.time() + self.backoff * 2 ** (job['attempts'] - 1)
+            else:
+                status = 'failed'
+                run_at = time.time()
+
+            with self._connect() as db:
+                db.execute(
+                    'UPDATE jobs SET status = ?, last_error = ?, run_at = ?, updated_at = ? WHERE id = ?',
+                    (status, error, run_at, time.time(), job['id'])
+                )
+            return
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job['id'])
+            )
+        print('Job {0} {1} done'.format(job['id'], job['name']))
+
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('teams', __name__)
 
-from app.teams import routes
\ No newline at end of file
+from app.teams import routes, commands
\ No newline at end of file
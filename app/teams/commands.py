@@ -0,0 +1,7 @@
+from app.teams import bp
+from app.teams.models import Membership
+
+@bp.cli.command('backfill-index')
+def backfill_index():
+    # flask teams backfill-index
+    Membership.backfill_index()
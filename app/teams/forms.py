@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Email, Length
 
@@ -16,4 +17,11 @@ class InviteForm(FlaskForm):
 
     role = SelectField('Role', choices=role_choices, default='READ', validators=[DataRequired()])
     
-    submit = SubmitField('INVITE')
\ No newline at end of file
+    submit = SubmitField('INVITE')
+
+class BulkInviteForm(FlaskForm):
+    csv = FileField('CSV of emails', validators=[FileRequired(), FileAllowed(['csv', 'txt'], 'CSV files only!')])
+
+    role = SelectField('Default role', choices=InviteForm.role_choices, default='READ', validators=[DataRequired()])
+
+    submit = SubmitField('INVITE ALL')
\ No newline at end of file
@@ -0,0 +1,91 @@
+from app.auth.models import User
+from app.metrics import propagate_context
+from app.teams.models import Membership
+from config import Config
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import re
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def parse_invites(stream, default_role, roles):
+    # email,role per line, the header and the role column are optional
+    text = io.StringIO(stream.read().decode('utf-8-sig'), newline='')
+
+    rows = []
+    seen = set()
+    for line_number, cells in enumerate(csv.reader(text), start=1):
+        cells = [cell.strip() for cell in cells]
+        if not any(cells):
+            continue
+        if line_number == 1 and '@' not in cells[0]:
+            continue # header
+
+        email = cells[0].lower()
+        role = (cells[1].upper() if len(cells) > 1 and cells[1] else default_role)
+        row = {"row": line_number, "email": email, "role": role, "status": None, "message": ""}
+
+        if not EMAIL.match(email):
+            row.update(status='error', message='Not an email address')
+        elif role not in roles:
+            row.update(status='error', message='Role must be one of {}'.format(', '.join(roles)))
+        elif email in seen:
+            row.update(status='error', message='Listed more than once')
+        seen.add(email)
+
+        rows.append(row)
+
+    if len(rows) > Config.BULK_INVITE_MAX:
+        raise ValueError('At most {} rows per upload'.format(Config.BULK_INVITE_MAX))
+
+    return rows
+
+
+def bulk_invite(team_id, rows, invited_by):
+    # fills in status on each row: added, invited, already member or error
+    pending = [row for row in rows if not row['status']]
+
+    users = User.get_many_by_email([row['email'] for row in pending])
+    members = Membership.team_index(team_id)
+
+    def invite(row):
+        try:
+            return User.invite(row['email'], invited_by=invited_by)
+        except Exception as e:
+            print(e)
+            row.update(status='error', message=str(e))
+            return None
+
+    new_accounts = [row for row in pending if row['email'] not in users]
+    if new_accounts:
+        with ThreadPoolExecutor(max_workers=min(Config.DB_FETCH_WORKERS, len(new_accounts))) as executor:
+            invited = list(executor.map(propagate_context(invite), new_accounts))
+
+        for row, user in zip(new_accounts, invited):
+            if user:
+                users[row['email']] = user
+                row['status'] = 'invited'
+
+    to_add = []
+    for row in pending:
+        user = users.get(row['email'])
+        if row['status'] == 'error' or not user:
+            continue
+
+        if user.id in members:
+            row.update(status='already member', message='Has {} access'.format(members[user.id]['role']))
+            continue
+
+        row['status'] = row['status'] or 'added'
+        to_add.append((row, user))
+
+    try:
+        Membership.create_many(team_id, [(user.id, row['role']) for row, user in to_add])
+    except Exception as e:
+        print(e)
+        for row, user in to_add:
+            row.update(status='error', message='Account exists but membership failed: {}'.format(e))
+
+    return rows
@@ -0,0 +1,197 @@
+from app import get_firebase
+from app.cache import versions
+from app.forks import PerProcess
+import copy
+import threading
+import time
+
+NODES = ['teams', 'memberships']
+
+
+def firebase_source(node, handler, database=None):
+    # blocks for as long as the stream stays up, its own Database as pyrebase keeps the path on it.
+    # pyrebase streams on a thread of its own, which ends when the handler raises
+    database = database or get_firebase().database()
+    stream = database.child(node).stream(handler)
+    stream.thread.join()
+
+    if stream.sse:
+        try:
+            stream.sse.close() # drop the connection before reconnecting
+        except Exception as e:
+            print(e)
+
+
+class Mirror():
+    # teams and memberships held in memory and kept current by the realtime
+    # database stream. Every (re)connect starts with a put of the whole node,
+    # which replaces what's here, so nothing missed while disconnected sticks
+    def __init__(self, source=firebase_source):
+        self.source = source
+        self.enabled = False
+        self.reconnect_delay = 1
+        self.teams = {}
+        self.memberships = {}
+        self.by_team = {} # team_id -> {user_id: membership_id}
+        self.by_user = {} # user_id -> {team_id: membership_id}
+        self._indexed = {} # membership_id -> (team_id, user_id)
+        self._ready = {node: False for node in NODES}
+        self._locks = PerProcess(threading.RLock) # a stream thread may have held it at the fork
+        self._streams = PerProcess(self._spawn)
+
+    def init_app(self, app):
+        self.enabled = app.config['MIRROR_ENABLED']
+        self.reconnect_delay = app.config['MIRROR_RECONNECT_DELAY']
+        app.extensions['mirror'] = self
+
+    def active(self):
+        # readers fall back to the database until both snapshots are in
+        if not self.enabled:
+            return False
+
+        self._streams.get()
+        with self._lock:
+            return all(self._ready.values())
+
+    @property
+    def _lock(self):
+        return self._locks.get()
+
+    def _spawn(self):
+        # a forked worker starts from its own snapshots
+        self._ready = {node: False for node in NODES}
+
+        threads = [threading.Thread(target=self._listen, args=(node,), name=f'mirror-{node}', daemon=True) for node in NODES]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _listen(self, node):
+        while True:
+            try:
+                self.source(node, lambda message: self.handle(node, message))
+                print(f'Mirror stream for {node} closed')
+            except Exception as e:
+                print(f'Mirror stream for {node} failed: {e}')
+
+            with self._lock:
+                self._ready[node] = False
+            time.sleep(self.reconnect_delay)
+
+    def handle(self, node, message):
+        if not message:
+            return
+
+        event = message.get('event')
+        if event in ['cancel', 'auth_revoked']:
+            raise Exception(event) # drop the stream, _listen reconnects
+        if event not in ['put', 'patch']:
+            return # keep-alive
+
+        parts = [part for part in message['path'].split('/') if part]
+        if event == 'put':
+            changes = [(parts, message['data'])]
+        else:
+            changes = [(parts + [key], value) for key, value in (message['data'] or {}).items()]
+
+        with self._lock:
+            for path, value in changes:
+                self._apply(node, path, value)
+            if not parts and event == 'put':
+                self._ready[node] = True
+
+    def apply_update(self, updates):
+        # this worker's own writes, so it reads them back before the stream catches up
+        if not self.active():
+            return
+
+        with self._lock:
+            for path, value in updates.items():
+                parts = [part for part in path.split('/') if part]
+                if parts and parts[0] in NODES:
+                    self._apply(parts[0], parts[1:], value)
+
+    def _apply(self, node, path, value):
+        tree = self.teams if node == 'teams' else self.memberships
+
+        if not path:
+            keys = set(tree) | set(value or {})
+            tree.clear()
+            tree.update(copy.deepcopy(value or {}))
+        else:
+            keys = {path[0]}
+            set_path(tree, path, copy.deepcopy(value))
+
+        if node == 'teams':
+            versions.bump(*[('team', team_id) for team_id in keys])
+        else:
+            for membership_id in keys:
+                self._reindex(membership_id)
+
+    def _reindex(self, membership_id):
+        # drop the old index entries for this membership, add the current ones
+        indexed = self._indexed.pop(membership_id, None)
+        if indexed:
+            team_id, user_id = indexed
+            self.by_team.get(team_id, {}).pop(user_id, None)
+            self.by_user.get(user_id, {}).pop(team_id, None)
+            versions.bump(('team', team_id), ('user', user_id))
+
+        membership_data = self.memberships.get(membership_id)
+        if isinstance(membership_data, dict) and membership_data.get('team_id') and membership_data.get('user_id'):
+            team_id = membership_data['team_id']
+            user_id = membership_data['user_id']
+            self.by_team.setdefault(team_id, {})[user_id] = membership_id
+            self.by_user.setdefault(user_id, {})[team_id] = membership_id
+            self._indexed[membership_id] = (team_id, user_id)
+            versions.bump(('team', team_id), ('user', user_id))
+
+    def team(self, team_id):
+        with self._lock:
+            return copy.deepcopy(self.teams.get(team_id))
+
+    def memberships_by(self, field, value):
+        # [(membership_id, membership_data)] like an order_by_child query
+        index = self.by_team if field == 'team_id' else self.by_user
+        with self._lock:
+            membership_ids = sorted(index.get(value, {}).values())
+            return [(membership_id, copy.deepcopy(self.memberships[membership_id])) for membership_id in membership_ids]
+
+    def role(self, user_id, team_id):
+        with self._lock:
+            membership_id = self.by_team.get(team_id, {}).get(user_id)
+            return self.memberships[membership_id].get('role') if membership_id else None
+
+    def team_index(self, team_id):
+        # same shape as membership_index/{team_id}
+        with self._lock:
+            return {
+                user_id: {"membership_id": membership_id, "role": self.memberships[membership_id].get('role')}
+                for user_id, membership_id in self.by_team.get(team_id, {}).items()
+            }
+
+
+# One per worker, its streams start on first use
+mirror = Mirror()
+
+
+def set_path(tree, path, value):
+    # like a realtime database put, None deletes and empty parents go
+    parents = []
+    node = tree
+    for part in path[:-1]:
+        if not isinstance(node.get(part), dict):
+            if value is None:
+                return
+            node[part] = {}
+        parents.append((node, part))
+        node = node[part]
+
+    if value is None:
+        node.pop(path[-1], None)
+    else:
+        node[path[-1]] = value
+
+    for parent, part in reversed(parents):
+        if parent[part] == {}:
+            del parent[part]
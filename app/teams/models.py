@@ -1,6 +1,13 @@
-from app import pyr_auth, pyr_db
-from firebase_admin import auth
-
+from app import pyr_auth, pyr_db, thread_db, admin_auth
+from app.metrics import propagate_context
+from app.cache import TTLCache, versions
+from app.teams.mirror import mirror
+from pyrebase.pyrebase import PyreResponse, convert_to_pyre
+from config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared across requests in this worker, keyed by team id, writes here update it
+team_cache = TTLCache(maxsize=Config.TEAM_CACHE_SIZE, ttl=Config.TEAM_CACHE_TTL, name='teams')
             
 class Team():
     def __init__(self, id_, name, account_id, conversion_event, facebook_token=None):
@@ -12,7 +19,52 @@ class Team():
     
     @staticmethod
     def get(team_id):
-        team_data = pyr_db.child('teams').child(team_id).get().val()
+        team_data = mirror.team(team_id) if mirror.active() else None
+        if team_data is None:
+            team_data = team_cache.get(team_id)
+        if team_data is None:
+            team_data = pyr_db.child('teams').child(team_id).get().val()
+            if team_data:
+                team_cache.set(team_id, dict(team_data))
+
+        team = Team.from_data(team_id, team_data)
+        return team
+
+    @staticmethod
+    def get_many(team_ids):
+        team_ids = list(team_ids)
+        if not team_ids:
+            return []
+
+        use_mirror = mirror.active()
+        cached = {team_id: (mirror.team(team_id) if use_mirror else None) or team_cache.get(team_id) for team_id in team_ids}
+        missing = [team_id for team_id, team_data in cached.items() if team_data is None]
+
+        def fetch(team_id):
+            return thread_db().child('teams').child(team_id).get().val()
+
+        if missing:
+            workers = min(Config.DB_FETCH_WORKERS, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fetched = list(executor.map(propagate_context(fetch), missing))
+
+            for team_id, team_data in zip(missing, fetched):
+                if team_data:
+                    team_cache.set(team_id, dict(team_data))
+                cached[team_id] = team_data
+
+        # same order as team_ids, None where the team no longer exists
+        teams = []
+        for team_id in team_ids:
+            team_data = cached[team_id]
+            if team_data:
+                teams.append(Team.from_data(team_id, team_data))
+            else:
+                teams.append(None)
+        return teams
+
+    @staticmethod
+    def from_data(team_id, team_data):
         team = Team(
             id_=team_id, 
             name=team_data['name'],
@@ -23,38 +75,78 @@ class Team():
         return team
 
     @staticmethod
-    def create(name):
-        team_res = pyr_db.child('teams').push({
+    def create(name, owner_id=None):
+        team_id = pyr_db.generate_key()
+        team_data = {
             "name": name
-        })
-        team_id = team_res['name'] # api sends id back as 'name'
+        }
+        updates = {
+            f"teams/{team_id}": team_data
+        }
+
+        if owner_id:
+            # owner membership goes in the same write, so there's never a team without one
+            membership_id = pyr_db.generate_key()
+            updates[f"memberships/{membership_id}"] = {
+                "user_id": owner_id,
+                "team_id": team_id,
+                "role": "OWNER"
+            }
+            updates[f"membership_index/{team_id}/{owner_id}"] = {
+                "membership_id": membership_id,
+                "role": "OWNER"
+            }
+
+        pyr_db.update(updates)
+        mirror.apply_update(updates)
         print('Sucessfully created new team: {0}'.format(team_id))
 
-        team = Team.get(team_id)
+        if owner_id:
+            versions.bump(('user', owner_id))
+
+        team_cache.set(team_id, dict(team_data))
+        team = Team.from_data(team_id, team_data)
         return team
 
     def update(self, name, account_id, conversion_event):
-        pyr_db.child('teams').child(self.id).update({
+        team_data = {
             "name": name,
             "account_id": account_id,
             "conversion_event": conversion_event 
-        })
+        }
+        pyr_db.child('teams').child(self.id).update(team_data)
+        mirror.apply_update({f"teams/{self.id}/{field}": value for field, value in team_data.items()})
 
         self.name = name
         self.account_id = account_id
         self.conversion_event = conversion_event
+        self._cache()
 
     def facebook_connect(self, token):
         pyr_db.child('teams').child(self.id).update({
             "facebook_token": token,
         })
+        mirror.apply_update({f"teams/{self.id}/facebook_token": token})
 
         self.facebook_token = token
+        self._cache()
 
     def remove(self):
         pyr_db.child('teams').child(self.id).remove()
+        mirror.apply_update({f"teams/{self.id}": None})
+        team_cache.delete(self.id)
+        versions.bump(('team', self.id))
         print(f'Team {self.id} removed')
 
+    def _cache(self):
+        # write-through, this worker sees its own changes straight away
+        team_data = {"name": self.name}
+        for field in ['account_id', 'conversion_event', 'facebook_token']:
+            if getattr(self, field) is not None:
+                team_data[field] = getattr(self, field)
+        team_cache.set(self.id, team_data)
+        versions.bump(('team', self.id))
+
 
 class Membership():
     def __init__(self, id_, user_id, team_id, role):
@@ -81,51 +173,159 @@ class Membership():
         if existing_role:
             raise Exception("User already has access")
         else:
-            membership_res = pyr_db.child('memberships').push({
+            membership_id = pyr_db.generate_key()
+
+            # membership and its index entry go in one multi-path write
+            updates = {
+                f"memberships/{membership_id}": {
+                    "user_id": user_id,
+                    "team_id": team_id,
+                    "role": role
+                },
+                f"membership_index/{team_id}/{user_id}": {
+                    "membership_id": membership_id,
+                    "role": role
+                }
+            }
+            pyr_db.update(updates)
+            mirror.apply_update(updates)
+            print('Sucessfully created membership: {0}'.format(membership_id))
+            versions.bump(('team', team_id), ('user', user_id))
+
+            membership = Membership(membership_id, user_id, team_id, role)
+            return membership
+
+    @staticmethod
+    def create_many(team_id, members):
+        # members is [(user_id, role)], every membership and index entry in one write
+        memberships = []
+        updates = {}
+        for user_id, role in members:
+            membership_id = pyr_db.generate_key()
+            updates[f"memberships/{membership_id}"] = {
                 "user_id": user_id,
                 "team_id": team_id,
                 "role": role
-            })
-            membership_id = membership_res['name'] # api sends id back as 'name'
-            print('Sucessfully created membership: {0}'.format(membership_id))
+            }
+            updates[f"membership_index/{team_id}/{user_id}"] = {
+                "membership_id": membership_id,
+                "role": role
+            }
+            memberships.append(Membership(membership_id, user_id, team_id, role))
 
-            membership = Membership.get(membership_id)
-            return membership
+        if updates:
+            pyr_db.update(updates)
+            mirror.apply_update(updates)
+            versions.bump(('team', team_id), *[('user', user_id) for user_id, _ in members])
+        print('Sucessfully created {0} memberships'.format(len(memberships)))
+
+        return memberships
 
     def update(self, role):
-        pyr_db.child('memberships').child(self.id).update({
-            "role": role
-        })
+        updates = {
+            f"memberships/{self.id}/role": role,
+            f"membership_index/{self.team_id}/{self.user_id}/role": role
+        }
+        pyr_db.update(updates)
+        mirror.apply_update(updates)
+        versions.bump(('team', self.team_id), ('user', self.user_id))
 
         self.role = role
 
     @staticmethod
     def get_users_by_team(team_id):
+        if mirror.active():
+            return PyreResponse(convert_to_pyre(mirror.memberships_by('team_id', team_id)), 'memberships')
+
         users_by_team = pyr_db.child("memberships").order_by_child("team_id").equal_to(team_id).get()
 
         return users_by_team
 
     @staticmethod
     def get_teams_by_user(user_id):
+        if mirror.active():
+            return PyreResponse(convert_to_pyre(mirror.memberships_by('user_id', user_id)), 'memberships')
+
         teams_by_user = pyr_db.child("memberships").order_by_child("user_id").equal_to(user_id).get()
 
         return teams_by_user
 
+    @staticmethod
+    def team_index(team_id):
+        # {user_id: {membership_id, role}} for everyone on the team
+        if mirror.active():
+            return mirror.team_index(team_id)
+
+        index = pyr_db.child('membership_index').child(team_id).get().val()
+        if index is None:
+            index = Membership.index_team(team_id) # not backfilled yet
+        return dict(index or {})
+
     @staticmethod
     def user_role(user_id, team_id):
-        users_by_team = pyr_db.child("memberships").order_by_child("team_id").equal_to(team_id).get()
+        if mirror.active():
+            return mirror.role(user_id, team_id)
 
-        role = None
-        for membership in users_by_team:
-            membership_data = membership.val()
+        index_data = pyr_db.child('membership_index').child(team_id).child(user_id).get().val()
+        if index_data is None and not Membership.team_indexed(team_id):
+            index_data = Membership.index_team(team_id).get(user_id) # not backfilled yet
 
-            if membership_data['user_id'] == user_id:
-                role = membership_data['role']
+        role = None
+        if index_data:
+            role = index_data['role']
         
         return role
 
     def remove(self):
-        pyr_db.child('memberships').child(self.id).remove()
+        updates = {
+            f"memberships/{self.id}": None,
+            f"membership_index/{self.team_id}/{self.user_id}": None
+        }
+        pyr_db.update(updates)
+        mirror.apply_update(updates)
+        versions.bump(('team', self.team_id), ('user', self.user_id))
+
+    @staticmethod
+    def team_indexed(team_id):
+        return pyr_db.child('membership_index').child(team_id).shallow().get().val() is not None
+
+    @staticmethod
+    def index_team(team_id):
+        # builds membership_index/{team_id} from the team's memberships, for teams from before the index
+        memberships = pyr_db.child("memberships").order_by_child("team_id").equal_to(team_id).get().each() or []
+
+        index = {}
+        for membership in memberships:
+            membership_data = membership.val()
+            index[membership_data['user_id']] = {
+                "membership_id": membership.key(),
+                "role": membership_data['role']
+            }
+
+        if index:
+            pyr_db.child('membership_index').child(team_id).update(index)
+            print('Sucessfully indexed {0} memberships for team {1}'.format(len(index), team_id))
+
+        return index
+
+    @staticmethod
+    def backfill_index():
+        # one-off rebuild of membership_index from existing memberships
+        memberships = pyr_db.child('memberships').get().each() or []
+
+        index = {}
+        for membership in memberships:
+            membership_data = membership.val()
+            index[f"{membership_data['team_id']}/{membership_data['user_id']}"] = {
+                "membership_id": membership.key(),
+                "role": membership_data['role']
+            }
+
+        if index:
+            pyr_db.child('membership_index').update(index)
+        print('Sucessfully indexed {0} memberships'.format(len(index)))
+
+        return len(index)
 
 
 
@@ -1,9 +1,12 @@
-from flask import render_template, flash, redirect, url_for, session, escape, abort
+from flask import render_template, flash, redirect, url_for, session, escape, abort, request, jsonify
 from flask_login import current_user, login_required
-from app.teams.forms import TeamForm, InviteForm
+from app.teams.forms import TeamForm, InviteForm, BulkInviteForm
 from app.teams import bp
 from app.auth.models import User
+from app.auth.snapshot import fresh_user
 from app.teams.models import Team, Membership
+from app.teams.invites import parse_invites, bulk_invite
+from app.pages import Page
 
 import requests
 import json
@@ -19,9 +22,7 @@ def add_team():
 
         #create a team
         try:
-            team = Team.create(name)
-
-            Membership.create(current_user.id, team.id, "OWNER")
+            team = Team.create(name, owner_id=current_user.id)
 
             # Update successful
             flash('Team id={}, created with name={}'.format(team.id, team.name), 'teal')
@@ -37,37 +38,49 @@ def add_team():
 @bp.route('/<team_id>', methods=['GET'])
 @login_required
 def view_team(team_id):
+    page = Page(team_id)
+    cached = page.cached()
+    if cached:
+        return cached
+
+    page.depends_on(('team', team_id))
     team = Team.get(team_id)
     users_by_team = Membership.get_users_by_team(team_id)
 
+    memberships = [(membership.key(), membership.val()) for membership in users_by_team]
+    users = User.get_many([membership_data['user_id'] for _, membership_data in memberships])
+
+    # access comes from the membership rows, a failed user lookup mustn't lock the viewer out
+    own = [membership_data for _, membership_data in memberships if membership_data['user_id'] == current_user.id]
+    if not own:
+        abort(401, "You don't have access to that team")
+    role = own[0]['role']
+
     team_members = []
-    authorized = False
-    role = False
-    for membership in users_by_team:
-        membership_data = membership.val()
-        user = User.get(membership_data['user_id'])
+    for membership_id, membership_data in memberships:
+        user = users.get(membership_data['user_id'])
+        if not user and membership_data['user_id'] == current_user.id:
+            user = current_user # already loaded
+        if not user:
+            # membership points at a deleted account
+            continue
 
         member = {
             "id": user.id,
             "name": user.name,
+            "photo_url": user.photo(64),
             "role": membership_data['role'],
-            "membership_id": membership.key()
+            "membership_id": membership_id
         }
         team_members.append(member)
 
-        if current_user.id == user.id:
-            authorized = True
-            role = membership_data['role']
-
-    if not authorized:
-        abort(401, "You don't have access to that team")
-
     session["team_id"] = team.id
     session["team_name"] = team.name
 
     title = 'View Team {}'.format(team.name)
         
-    return render_template('teams/view_team.html', title=title, team=team, team_members=team_members, role=role)
+    html = render_template('teams/view_team.html', title=title, team=team, team_members=team_members, role=role)
+    return page.render(html, team_id=team.id, team_name=team.name)
 
 
 @bp.route('/<team_id>/edit', methods=['GET', 'POST'])
@@ -109,6 +122,7 @@ def edit_team(team_id):
         team=team)
 
 @bp.route('/<team_id>/invite', methods=['GET', 'POST'])
+@fresh_user
 @login_required
 def invite_user(team_id):
     role = Membership.user_role(current_user.id, team_id)
@@ -128,7 +142,7 @@ def invite_user(team_id):
             user = User.get_by_email(email)
 
             if not user:
-                user = User.invite(email)
+                user = User.invite(email, invited_by=current_user.id)
                 
             membership = Membership.create(user.id, team_id, role)
 
@@ -142,15 +156,58 @@ def invite_user(team_id):
         
     return render_template('teams/invite_user.html', title='Invite User', form=form, team=team)
 
+@bp.route('/<team_id>/invite/bulk', methods=['GET', 'POST'])
+@fresh_user
+@login_required
+def bulk_invite_users(team_id):
+    role = Membership.user_role(current_user.id, team_id)
+    if role not in ["ADMIN", "OWNER"]:
+        abort(401, "You don't have access to invite to this team.")
+
+    form = BulkInviteForm()
+
+    team = Team.get(team_id)
+    report = None
+
+    if form.validate_on_submit():
+        try:
+            rows = parse_invites(form.csv.data.stream, form.role.data, InviteForm.available_roles)
+            report = bulk_invite(team_id, rows, current_user.id)
+
+            added = len([row for row in report if row['status'] in ['added', 'invited']])
+            flash('{} of {} users added to team {}'.format(added, len(report), team.name), 'teal')
+
+        except Exception as e:
+            # Upload unsuccessful
+            flash("Error: {}".format(e), 'red')
+
+        if request.accept_mimetypes.best == 'application/json':
+            if report is None:
+                return jsonify({"error": "Couldn't read that file"}), 400
+            return jsonify(report)
+
+    return render_template('teams/bulk_invite.html', title='Bulk Invite', form=form, team=team, report=report)
+
 @bp.route('/', methods=['GET'])
 @login_required
 def list_teams():
+    page = Page()
+    cached = page.cached()
+    if cached:
+        return cached
+
+    page.depends_on(('user', current_user.id))
     teams_by_user = Membership.get_teams_by_user(current_user.id)
 
+    memberships = [membership.val() for membership in teams_by_user]
+    page.depends_on(*[('team', membership_data['team_id']) for membership_data in memberships])
+    teams = Team.get_many([membership_data['team_id'] for membership_data in memberships])
+
     teams_list = []
-    for membership in teams_by_user:
-        membership_data = membership.val()
-        team_data = Team.get(membership_data['team_id'])
+    for membership_data, team_data in zip(memberships, teams):
+        if not team_data:
+            # membership points at a removed team
+            continue
 
         team = {
             "id": team_data.id,
@@ -159,9 +216,11 @@ def list_teams():
         }
         teams_list.append(team)
 
-    return render_template('teams/list_teams.html', title='Teams', teams_list=teams_list)
+    html = render_template('teams/list_teams.html', title='Teams', teams_list=teams_list)
+    return page.render(html)
 
 @bp.route('/<membership_id>/delete', methods=['GET', 'POST'])
+@fresh_user
 @login_required
 def remove_user(membership_id):
 
@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from benchmarks import fakes
+
+# python -m benchmarks.bench_routes --requests 50 --members 200 --teams 50
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def seed(members, teams):
+    from app.auth.models import User
+    from app.teams.models import Team, Membership
+
+    owner = User.create('Bench Owner', 'owner@example.com', 'password')
+
+    # one big team with every member
+    big_team = Team.create('Big Team', owner_id=owner.id)
+    big_team.update('Big Team', '123456789', 'landing_page_view')
+    big_team.facebook_connect('fake-token')
+
+    for i in range(members - 1):
+        member = User.create(f'Member {i}', f'member{i}@example.com', 'password')
+        Membership.create(member.id, big_team.id, 'READ')
+
+    # and lots of small teams the owner belongs to
+    for i in range(teams - 1):
+        team = Team.create(f'Team {i}')
+        Membership.create(owner.id, team.id, 'ADMIN')
+
+    return owner, big_team
+
+def run(args):
+    fakes.install()
+
+    # a throwaway job table, seeding queues a verification email per user
+    os.environ['TASKS_DB'] = os.path.join(tempfile.mkdtemp(), 'tasks.db')
+    if args.mirror:
+        os.environ['MIRROR'] = '1'
+
+    from app import create_app, tasks
+    from app.auth.models import user_cache
+    from app.charts.insights import insights_cache
+    from app.teams.models import team_cache
+    from app.pages import page_cache
+    from app.teams.mirror import mirror
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    fakes.mount_cloud_functions(app)
+
+    # the models print on every call, keep that out of the report
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with app.app_context(), quiet:
+        owner, big_team = seed(args.members, args.teams)
+
+        # let the emails go out before anything is measured
+        while tasks.pending():
+            time.sleep(0.05)
+
+        # and the mirror load its snapshot
+        while args.mirror and not mirror.active():
+            time.sleep(0.05)
+
+    # simulated latency only applies to the measured requests
+    fakes.backends.latency = {
+        'pyr_db': args.db_latency / 1000,
+        'pyr_auth': args.auth_latency / 1000,
+        'pyr_store': args.auth_latency / 1000,
+        'admin_auth': args.auth_latency / 1000,
+        'http': args.http_latency / 1000
+    }
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = owner.id
+        session['_fresh'] = True
+        session['team_id'] = big_team.id
+        session['team_name'] = big_team.name
+
+    routes = [
+        ('view_team', f'/teams/{big_team.id}'),
+        ('list_teams', '/teams/'),
+        ('dashboard', '/charts/'),
+        ('facebook_dashboard', '/charts/facebook'),
+        ('insights (test)', '/charts/api/insights?source=test'),
+        ('insights (facebook)', '/charts/api/insights?source=facebook'),
+        ('connectors', '/connectors/')
+    ]
+
+    print(f"{args.members} members, {args.teams} teams, {args.requests} requests per route")
+    print(f"latency ms: db={args.db_latency} auth={args.auth_latency} http={args.http_latency}")
+    if args.mirror:
+        print('teams and memberships from the in-memory mirror')
+    print('')
+    print(f"{'route':<22}{'cold ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  remote calls per request")
+
+    for name, url in routes:
+        if args.cold:
+            user_cache.clear()
+            insights_cache.clear()
+            team_cache.clear()
+            page_cache.clear()
+
+        timings = []
+        calls = []
+        for i in range(args.requests):
+            fakes.backends.reset()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            calls.append(fakes.backends.snapshot())
+
+            if response.status_code != 200:
+                raise Exception(f"{url} returned {response.status_code}")
+
+        warm = timings[1:] or timings
+        average_calls = {}
+        for call in calls[1:] or calls:
+            for backend, count in call.items():
+                average_calls[backend] = average_calls.get(backend, 0) + count / len(calls[1:] or calls)
+
+        call_summary = ', '.join(f"{backend}={count:g}" for backend, count in sorted(average_calls.items())) or 'none'
+        cold_summary = ', '.join(f"{backend}={count}" for backend, count in sorted(calls[0].items())) or 'none'
+
+        print(f"{name:<22}{timings[0]:>9.1f}{percentile(warm, 50):>9.1f}{percentile(warm, 95):>9.1f}{percentile(warm, 99):>9.1f}  {call_summary} (cold: {cold_summary})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark FireFlask routes against local fake backends')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--teams', type=int, default=50)
+    parser.add_argument('--db-latency', type=float, default=20, help='ms per realtime database call')
+    parser.add_argument('--auth-latency', type=float, default=40, help='ms per auth or storage call')
+    parser.add_argument('--http-latency', type=float, default=150, help='ms per cloud function call')
+    parser.add_argument('--cold', action='store_true', help='clear the worker caches before each route')
+    parser.add_argument('--mirror', action='store_true', help='serve teams and memberships from the stream mirror')
+
+    run(parser.parse_args())
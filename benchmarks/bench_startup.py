@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# python -m benchmarks.bench_startup --before <commit>
+# Times a cold `import app` + create_app() in fresh interpreters, for the
+# tree at <commit> and for the working tree.
+
+# Without --service-account a throwaway key is used and pyrebase's storage
+# client (which fetches the bucket over the network) is stubbed, so eager
+# trees are timed without that round trip
+OFFLINE = '''
+from google.cloud import storage
+class OfflineClient():
+    def __init__(self, *args, **kwargs):
+        pass
+    def get_bucket(self, name):
+        return None
+storage.Client = OfflineClient
+'''
+
+STARTUP = '''
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(imported - start, created - imported)
+'''
+
+def fake_service_account(path):
+    # a throwaway key so the certificate loads without real credentials
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode('utf-8')
+
+    with open(path, 'w') as f:
+        json.dump({
+            "type": "service_account",
+            "project_id": "fireflask-bench",
+            "private_key_id": "bench",
+            "private_key": pem,
+            "client_email": "bench@fireflask-bench.iam.gserviceaccount.com",
+            "client_id": "1",
+            "token_uri": "https://oauth2.googleapis.com/token"
+        }, f)
+
+def export_revision(revision, target):
+    archive = subprocess.run(['git', 'archive', revision], check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+
+def export_working_tree(target):
+    files = subprocess.run(['git', 'ls-files', '-co', '--exclude-standard'], check=True,
+        capture_output=True, text=True).stdout.splitlines()
+    for name in files:
+        if not os.path.isfile(name):
+            continue
+        os.makedirs(os.path.join(target, os.path.dirname(name)), exist_ok=True)
+        shutil.copy2(name, os.path.join(target, name))
+
+def measure(tree, runs, service_account=None):
+    key_path = os.path.join(tree, 'app', 'firebase-private-key.json')
+    if service_account:
+        shutil.copy(service_account, key_path)
+        script = STARTUP
+    else:
+        fake_service_account(key_path)
+        script = OFFLINE + STARTUP
+
+    env = dict(os.environ, PYTHONPATH=tree, FIREBASE_API_KEY=os.environ.get('FIREBASE_API_KEY', 'bench'))
+
+    imports = []
+    creates = []
+    for i in range(runs + 1):
+        result = subprocess.run([sys.executable, '-c', script], cwd=tree, env=env,
+            check=True, capture_output=True, text=True)
+        imported, created = [float(value) for value in result.stdout.split()[-2:]]
+
+        # the first run writes the bytecode cache
+        if i:
+            imports.append(imported * 1000)
+            creates.append(created * 1000)
+
+    return imports, creates
+
+def report(name, imports, creates):
+    totals = [i + c for i, c in zip(imports, creates)]
+    print(f"{name:<16}{statistics.median(imports):>12.1f}{statistics.median(creates):>14.1f}"
+        f"{statistics.median(totals):>12.1f}{min(totals):>10.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare cold import + create_app time between two trees')
+    parser.add_argument('--before', required=True, help='git revision to compare against')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--service-account', help='real key file, times the eager network setup too')
+    args = parser.parse_args()
+
+    before = tempfile.mkdtemp()
+    after = tempfile.mkdtemp()
+    try:
+        export_revision(args.before, before)
+        export_working_tree(after)
+
+        print(f"{args.runs} runs each, median ms")
+        print(f"{'tree':<16}{'import app':>12}{'create_app()':>14}{'total':>12}{'min':>10}")
+        report(args.before, *measure(before, args.runs, args.service_account))
+        report('working tree', *measure(after, args.runs, args.service_account))
+    finally:
+        shutil.rmtree(before)
+        shutil.rmtree(after)
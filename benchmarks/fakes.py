@@ -0,0 +1,521 @@
+from pyrebase.pyrebase import PyreResponse, convert_to_pyre
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from urllib.parse import urlparse, parse_qs, quote
+from collections import Counter
+from types import SimpleNamespace
+from flask import Flask, request
+import firebase_admin
+from firebase_admin import auth, credentials
+import pyrebase
+import threading
+import queue
+import random
+import string
+import copy
+import json
+import time
+import os
+
+
+class Backends():
+    # Simulated latency (seconds) and call counts for every fake backend
+    def __init__(self, latency=None):
+        self.latency = latency or {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, backend):
+        with self._lock:
+            self.calls[backend] += 1
+
+        delay = self.latency.get(backend, 0)
+        if delay:
+            time.sleep(delay)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.calls)
+
+
+backends = Backends()
+
+
+def push_key():
+    return '-' + ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(19))
+
+
+class FakeStore():
+    # Shared in-memory tree behind every FakeDatabase
+    def __init__(self):
+        self.root = {}
+        self.lock = threading.RLock()
+        self.streams = []
+
+    def read(self, path):
+        with self.lock:
+            node = self.root
+            for part in path:
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return copy.deepcopy(node)
+
+    def write(self, path, value):
+        with self.lock:
+            if not path:
+                self.root = copy.deepcopy(value) or {}
+                self.notify(path)
+                return
+
+            node = self.root
+            for part in path[:-1]:
+                node = node.setdefault(part, {})
+
+            if value is None:
+                node.pop(path[-1], None)
+            else:
+                node[path[-1]] = copy.deepcopy(value)
+
+            self.prune(path[:-1])
+            self.notify(path)
+
+    def notify(self, path):
+        # called under the lock, so streams see writes in order
+        for stream in list(self.streams):
+            if path[:len(stream.path)] == stream.path:
+                relative = path[len(stream.path):]
+                stream.send('put', '/' + '/'.join(relative), self.read(path))
+            elif stream.path[:len(path)] == path:
+                stream.send('put', '/', self.read(stream.path))
+
+    def disconnect(self):
+        # drops every open stream, like the connection going away
+        with self.lock:
+            for stream in list(self.streams):
+                stream.close()
+
+    def prune(self, path):
+        # firebase drops parents that end up empty
+        while path:
+            parent = self.root
+            for part in path[:-1]:
+                parent = parent.get(part) if isinstance(parent, dict) else None
+            if isinstance(parent, dict) and parent.get(path[-1]) == {}:
+                parent.pop(path[-1])
+            path = path[:-1]
+
+
+class FakeDatabase():
+    # Stands in for pyrebase.Database, path is reset after every call like pyrebase
+    def __init__(self, store):
+        self.store = store
+        self.path = ""
+        self.build_query = {}
+
+    def child(self, *args):
+        new_path = "/".join([str(arg) for arg in args]).strip("/")
+        self.path = "/".join([part for part in [self.path, new_path] if part])
+        return self
+
+    def order_by_child(self, order):
+        self.build_query["orderBy"] = order
+        return self
+
+    def order_by_key(self):
+        self.build_query["orderBy"] = "$key"
+        return self
+
+    def equal_to(self, equal_to):
+        self.build_query["equalTo"] = equal_to
+        return self
+
+    def start_at(self, start):
+        self.build_query["startAt"] = start
+        return self
+
+    def end_at(self, end):
+        self.build_query["endAt"] = end
+        return self
+
+    def shallow(self):
+        self.build_query["shallow"] = True
+        return self
+
+    def stream(self, stream_handler, token=None, stream_id=None):
+        # Pyrebase4 4.3.0's signature, always on a thread of its own
+        path, _ = self._take()
+        backends.call('pyr_db')
+
+        return FakeStream(self.store, path, stream_handler, stream_id)
+
+    def generate_key(self):
+        return push_key()
+
+    def _take(self):
+        path = [part for part in self.path.split("/") if part]
+        query = self.build_query
+        self.path = ""
+        self.build_query = {}
+        return path, query
+
+    def get(self, token=None):
+        path, query = self._take()
+        backends.call('pyr_db')
+
+        query_key = path[-1] if path else ""
+        value = self.store.read(path)
+
+        if query.get("shallow") and isinstance(value, dict):
+            return PyreResponse(value.keys(), query_key)
+        if query.get("orderBy") == "$key":
+            children = value if isinstance(value, dict) else {}
+            items = [(key, child) for key, child in children.items()
+                if query.get("startAt", key) <= key <= query.get("endAt", key)]
+            return PyreResponse(convert_to_pyre(sorted(items)), query_key)
+        if query.get("orderBy"):
+            children = value if isinstance(value, dict) else {}
+            items = [(key, child) for key, child in children.items()
+                if isinstance(child, dict) and child.get(query["orderBy"]) == query.get("equalTo")]
+            return PyreResponse(convert_to_pyre(sorted(items)), query_key)
+        if isinstance(value, dict):
+            return PyreResponse(convert_to_pyre(value.items()), query_key)
+        return PyreResponse(value, query_key)
+
+    def push(self, data, token=None):
+        path, _ = self._take()
+        backends.call('pyr_db')
+
+        key = push_key()
+        self.store.write(path + [key], data)
+        return {"name": key}
+
+    def set(self, data, token=None):
+        path, _ = self._take()
+        backends.call('pyr_db')
+
+        self.store.write(path, data)
+        return data
+
+    def update(self, data, token=None):
+        path, _ = self._take()
+        backends.call('pyr_db')
+
+        # keys may be multi-location paths
+        with self.store.lock:
+            for key, value in data.items():
+                self.store.write(path + [part for part in key.split("/") if part], value)
+        return data
+
+    def remove(self, token=None):
+        path, _ = self._take()
+        backends.call('pyr_db')
+
+        self.store.write(path, None)
+
+
+class FakeStream():
+    # Same events as a pyrebase Stream: a put of the whole path first, then a put per write under it
+    def __init__(self, store, path, stream_handler, stream_id):
+        self.store = store
+        self.path = path
+        self.stream_handler = stream_handler
+        self.stream_id = stream_id
+        self.events = queue.Queue()
+        self.sse = None
+        self.thread = None
+
+        with store.lock:
+            self.send('put', '/', store.read(path))
+            store.streams.append(self)
+
+        self.start()
+
+    def send(self, event, path, data):
+        self.events.put({"event": event, "path": path, "data": data})
+
+    def start(self):
+        self.thread = threading.Thread(target=self.start_stream, daemon=True)
+        self.thread.start()
+        return self
+
+    def start_stream(self):
+        try:
+            while True:
+                message = self.events.get()
+                if message is None:
+                    return
+                if self.stream_id:
+                    message["stream_id"] = self.stream_id
+                self.stream_handler(message)
+        finally:
+            self._detach()
+
+    def close(self):
+        # doesn't wait for the thread, disconnect() holds the store lock it detaches under
+        self._detach()
+        self.events.put(None)
+        return self
+
+    def _detach(self):
+        with self.store.lock:
+            if self in self.store.streams:
+                self.store.streams.remove(self)
+
+
+class FakeStorage():
+    # A new one per storage() call like pyrebase, the files are shared
+    def __init__(self, files):
+        self.path = ""
+        self.files = files
+
+    def child(self, *args):
+        self.path = "/".join([part for part in [self.path] + [str(arg) for arg in args] if part])
+        return self
+
+    def put(self, file, token=None):
+        # Pyrebase4 4.3.0's signature, a path or a file object
+        path, self.path = self.path, ""
+        backends.call('pyr_store')
+
+        if hasattr(file, 'read'):
+            self.files[path] = file.read()
+        else:
+            with open(file, 'rb') as f:
+                self.files[path] = f.read()
+        return {"name": path}
+
+    def get_url(self, token):
+        path, self.path = self.path, ""
+        return f"https://storage.local/o/{quote(path, safe='')}?alt=media"
+
+
+class FakeUsers():
+    # One user table behind both pyrebase auth and firebase_admin.auth
+    def __init__(self):
+        self.by_uid = {}
+        self.lock = threading.Lock()
+
+    def add(self, email, password, display_name=None):
+        uid = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(28))
+        with self.lock:
+            if self.by_email(email):
+                raise auth.EmailAlreadyExistsError('EMAIL_EXISTS', None, None)
+
+            self.by_uid[uid] = {
+                "uid": uid,
+                "email": email,
+                "password": password,
+                "display_name": display_name,
+                "email_verified": False,
+                "photo_url": None,
+                "created": int(time.time() * 1000)
+            }
+        return self.by_uid[uid]
+
+    def by_email(self, email):
+        for user in self.by_uid.values():
+            if user["email"] == email:
+                return user
+        return None
+
+    def record(self, user):
+        return SimpleNamespace(
+            uid=user["uid"],
+            email=user["email"],
+            display_name=user["display_name"],
+            email_verified=user["email_verified"],
+            photo_url=user["photo_url"],
+            user_metadata=SimpleNamespace(creation_timestamp=user["created"])
+        )
+
+
+class FakeAuth():
+    # Stands in for pyrebase.Auth
+    def __init__(self, users):
+        self.users = users
+
+    def _sign_in(self, user):
+        return {
+            "localId": user["uid"],
+            "email": user["email"],
+            "displayName": user["display_name"] or "",
+            "idToken": user["uid"],
+            "refreshToken": user["uid"]
+        }
+
+    def sign_in_with_email_and_password(self, email, password):
+        backends.call('pyr_auth')
+        user = self.users.by_email(email)
+        if not user or user["password"] != password:
+            raise Exception("INVALID_PASSWORD", json.dumps({"error": {"message": "INVALID_PASSWORD"}}))
+        return self._sign_in(user)
+
+    def sign_in_with_custom_token(self, token):
+        backends.call('pyr_auth')
+        return self._sign_in(self.users.by_uid[token])
+
+    def create_user_with_email_and_password(self, email, password):
+        backends.call('pyr_auth')
+        return self._sign_in(self.users.add(email, password))
+
+    def get_account_info(self, id_token):
+        backends.call('pyr_auth')
+        user = self.users.by_uid[id_token]
+        return {"users": [{"localId": user["uid"], "email": user["email"],
+            "emailVerified": user["email_verified"], "createdAt": str(user["created"])}]}
+
+    def send_email_verification(self, id_token):
+        backends.call('pyr_auth')
+
+    def send_password_reset_email(self, email):
+        backends.call('pyr_auth')
+
+
+class FakeFirebase():
+    # Stands in for the object pyrebase.initialize_app returns
+    def __init__(self, store, users):
+        self.store = store
+        self.users = users
+        self.files = {}
+
+    def database(self):
+        return FakeDatabase(self.store)
+
+    def auth(self):
+        return FakeAuth(self.users)
+
+    def storage(self):
+        return FakeStorage(self.files)
+
+
+class FakeAdminAuth():
+    # Replacements for the firebase_admin.auth functions the app calls
+    def __init__(self, users):
+        self.users = users
+
+    def get_user(self, uid, app=None):
+        backends.call('admin_auth')
+        user = self.users.by_uid.get(uid)
+        if not user:
+            raise auth.UserNotFoundError(f'No user record found for the provided user ID: {uid}.')
+        return self.users.record(user)
+
+    def get_users(self, identifiers, app=None):
+        backends.call('admin_auth')
+        if len(identifiers) > 100:
+            raise ValueError('`identifiers` parameter must have <= 100 entries.')
+
+        found = []
+        not_found = []
+        for identifier in identifiers:
+            if hasattr(identifier, 'email'):
+                user = self.users.by_email(identifier.email)
+            else:
+                user = self.users.by_uid.get(identifier.uid)
+            if user:
+                found.append(self.users.record(user))
+            else:
+                not_found.append(identifier)
+        return SimpleNamespace(users=found, not_found=not_found)
+
+    def get_user_by_email(self, email, app=None):
+        backends.call('admin_auth')
+        user = self.users.by_email(email)
+        if not user:
+            raise auth.UserNotFoundError(f'No user record found for the provided email: {email}.')
+        return self.users.record(user)
+
+    def create_user(self, email=None, password=None, display_name=None, **kwargs):
+        backends.call('admin_auth')
+        return self.users.record(self.users.add(email, password, display_name))
+
+    def update_user(self, uid, email=None, display_name=None, email_verified=None, photo_url=None, **kwargs):
+        backends.call('admin_auth')
+        user = self.users.by_uid[uid]
+        for key, value in [("email", email), ("display_name", display_name),
+                ("email_verified", email_verified), ("photo_url", photo_url)]:
+            if value is not None:
+                user[key] = value
+        return self.users.record(user)
+
+    def delete_user(self, uid, app=None):
+        backends.call('admin_auth')
+        self.users.by_uid.pop(uid, None)
+
+    def verify_id_token(self, id_token, app=None, check_revoked=False, clock_skew_seconds=0):
+        # fake id tokens are the uid, the real sdk checks the signature locally
+        user = self.users.by_uid[id_token]
+        claims = {"uid": user["uid"], "sub": user["uid"], "email": user["email"],
+            "email_verified": user["email_verified"]}
+        if user["display_name"]:
+            claims["name"] = user["display_name"]
+        if user["photo_url"]:
+            claims["picture"] = user["photo_url"]
+        return claims
+
+    def create_custom_token(self, uid, developer_claims=None, app=None):
+        # signed locally by the real sdk, no backend call
+        return uid.encode('utf-8')
+
+    def install(self):
+        for name in ['get_user', 'get_users', 'get_user_by_email', 'create_user', 'update_user', 'delete_user',
+                'verify_id_token', 'create_custom_token']:
+            setattr(auth, name, getattr(self, name))
+
+
+class FakeCloudFunctions(BaseAdapter):
+    # Mounted on the app's http session in place of the cloud function urls
+    def __init__(self):
+        super().__init__()
+        from functions.get_test_data.main import main as get_test_data
+        self.get_test_data = get_test_data
+        self.app = Flask(__name__)
+
+    def send(self, prepared, **kwargs):
+        backends.call('http')
+
+        url = urlparse(prepared.url)
+        args = {key: values[0] for key, values in parse_qs(url.query).items()}
+        args["access_token"] = args.get("access_token") or "fake"
+
+        # facebook rows have the same shape as the test data
+        os.environ.setdefault('APP_ID', 'fake')
+        os.environ.setdefault('APP_SECRET', 'fake')
+        with self.app.test_request_context('/', query_string=args):
+            body = self.get_test_data(request).get_data()
+
+        response = Response()
+        response.status_code = 200
+        response._content = body
+        response.headers['Content-Type'] = 'application/json'
+        response.url = prepared.url
+        response.request = prepared
+        return response
+
+    def close(self):
+        pass
+
+
+def install(latency=None):
+    # Patch the firebase clients before `app` is imported
+    backends.latency = latency or {}
+
+    store = FakeStore()
+    users = FakeUsers()
+    fake_firebase = FakeFirebase(store, users)
+
+    pyrebase.initialize_app = lambda config: fake_firebase
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    FakeAdminAuth(users).install()
+
+    return fake_firebase
+
+
+def mount_cloud_functions(app):
+    app.extensions['http'].session.mount('https://us-central1-', FakeCloudFunctions())
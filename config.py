@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(16)
@@ -17,6 +18,44 @@ class Config(object):
 
     ACCESS_TOKEN = os.environ.get('ACCESS_TOKEN')
 
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300)) # seconds
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_SNAPSHOT_TTL = int(os.environ.get('USER_SNAPSHOT_TTL', 300)) # seconds the session copy of the user is trusted
+    TEAM_CACHE_TTL = int(os.environ.get('TEAM_CACHE_TTL', 30)) # seconds, other workers' writes show up after this
+    TEAM_CACHE_SIZE = int(os.environ.get('TEAM_CACHE_SIZE', 1024))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 30)) # seconds, rendered team pages
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+
+    DB_FETCH_WORKERS = int(os.environ.get('DB_FETCH_WORKERS', 8))
+    BULK_INVITE_MAX = int(os.environ.get('BULK_INVITE_MAX', 1000)) # rows per csv
+
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05)) # seconds
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60)) # below gunicorn's 100s timeout, read timeouts aren't retried
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.5))
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+    PORTFOLIO_WORKERS = int(os.environ.get('PORTFOLIO_WORKERS', 8))
+    PORTFOLIO_DEADLINE = float(os.environ.get('PORTFOLIO_DEADLINE', 20)) # seconds for all teams
+
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 4))
+
+    TASKS_DB = os.environ.get('TASKS_DB', os.path.join(tempfile.gettempdir(), 'fireflask-tasks.db')) # sqlite job table
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2)) # threads per process
+    TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 5))
+    TASK_BACKOFF = float(os.environ.get('TASK_BACKOFF', 2)) # seconds, doubles each retry
+    TASK_TIMEOUT = int(os.environ.get('TASK_TIMEOUT', 300)) # seconds before a running job is picked up again
+
+    MIRROR_ENABLED = os.environ.get('MIRROR', '0') == '1' # teams and memberships from the database stream
+    MIRROR_RECONNECT_DELAY = float(os.environ.get('MIRROR_RECONNECT_DELAY', 1)) # seconds
+
+    METRICS_ENDPOINT = os.environ.get('METRICS_ENDPOINT', '0') == '1' # serve /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # required as a bearer token when set
+
+    INSIGHTS_CACHE_SIZE = int(os.environ.get('INSIGHTS_CACHE_SIZE', 50000)) # days
+    INSIGHTS_CACHE_TTL = int(os.environ.get('INSIGHTS_CACHE_TTL', 86400)) # seconds, past days
+    INSIGHTS_TODAY_TTL = int(os.environ.get('INSIGHTS_TODAY_TTL', 300)) # seconds, yesterday and today, which can still change
+
     CONNECTORS = {
         "facebook_app_id": "2380723265555589",
         "facebook_app_secret": os.environ.get('FACEBOOK_APP_SECRET'),
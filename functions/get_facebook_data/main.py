@@ -1,9 +1,21 @@
 from flask import jsonify
 import os
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.adaccount import AdAccount
+from facebook_business.adobjects.adreportrun import AdReportRun
 from facebook_business.adobjects.adsinsights import AdsInsights
 
+WINDOW_DAYS = int(os.environ.get('WINDOW_DAYS', 31)) # days per insights call
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 4))
+ASYNC_THRESHOLD_DAYS = int(os.environ.get('ASYNC_THRESHOLD_DAYS', 186)) # bigger ranges use report runs
+POLL_INTERVAL = 2 # seconds
+POLL_TIMEOUT = int(os.environ.get('POLL_TIMEOUT', 50)) # seconds, inside the app's 60s read timeout and the function's own
+
+FIELDS = ['spend', 'impressions', 'inline_link_clicks', 'actions']
+
 def main(request):
     access_token = request.args.get('access_token')
     account_id = request.args.get('account_id')
@@ -23,34 +35,90 @@ def main(request):
 
     # Make a call to the Facebook API
     my_account = AdAccount('act_'+account_id)
-    fields = ['spend', 'impressions', 'inline_link_clicks', 'actions']
+
+    s_date = datetime.strptime(date_start, '%Y-%m-%d')
+    e_date = datetime.strptime(date_end, '%Y-%m-%d')
+    total_days = (e_date - s_date).days + 1
+
+    data = []
+    if total_days > ASYNC_THRESHOLD_DAYS:
+        # One report run for the whole range, so only one poll to wait on
+        for day in fetch_async(my_account, date_start, date_end):
+            data.append(format_day(day, conversion_event))
+    else:
+        # Split the range into windows and fetch them side by side
+        windows = date_windows(s_date, e_date, WINDOW_DAYS)
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(windows))) as executor:
+            results = executor.map(lambda window: fetch_sync(my_account, window[0], window[1]), windows)
+
+            for insights in results:
+                for day in insights:
+                    data.append(format_day(day, conversion_event))
+
+    # Stitch windows back into one per-day series
+    data.sort(key=lambda row: row['date'])
+
+    return jsonify(data)
+
+def insights_params(since, until):
     params = {
-        'level': 'account', 
-        'time_range': {'since': date_start, 'until': date_end}, 
+        'level': 'account',
+        'time_range': {'since': since, 'until': until},
         'time_increment': 1
         }
-    
-    insights = my_account.get_insights(fields=fields, params=params)
-    data = []
-    for day in insights:
-        format_data = {}
-        format_data['date'] = day['date_start']
-        format_data['impressions'] = day['impressions']
-        format_data['clicks'] = day['inline_link_clicks']
-        format_data['spend'] = day['spend']
-
-        # Pull out conversion metric
-        conversions = [action.get('value') for action in day['actions'] if action.get('action_type') == conversion_event]
-        
-        if conversions:
-            format_data['conversions'] = conversions[0]
-        else:
-            format_data['conversions'] = "0"
-        
-        # Append to the data list
-        data.append(format_data)
+    return params
 
-    return jsonify(data)
+def fetch_sync(account, since, until):
+    insights = account.get_insights(fields=FIELDS, params=insights_params(since, until))
+    return list(insights)
+
+def fetch_async(account, since, until):
+    # Submit a report run, poll until it completes, then page through the result
+    job = account.get_insights(fields=FIELDS, params=insights_params(since, until), is_async=True)
+
+    waited = 0
+    while True:
+        job.api_get()
+        status = job[AdReportRun.Field.async_status]
+        print(f"Report {job['id']} {since} to {until}: {status} {job[AdReportRun.Field.async_percent_completion]}%")
+
+        if status == 'Job Completed':
+            break
+        if status in ['Job Failed', 'Job Skipped']:
+            raise Exception(f"Report {job['id']} {status}")
+        if waited >= POLL_TIMEOUT:
+            raise Exception(f"Report {job['id']} timed out after {waited}s")
+
+        time.sleep(POLL_INTERVAL)
+        waited += POLL_INTERVAL
+
+    return list(job.get_result())
+
+def date_windows(s_date, e_date, days):
+    windows = []
+    window_start = s_date
+    while window_start <= e_date:
+        window_end = min(window_start + timedelta(days=days - 1), e_date)
+        windows.append((window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d')))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+def format_day(day, conversion_event):
+    format_data = {}
+    format_data['date'] = day['date_start']
+    format_data['impressions'] = day['impressions']
+    format_data['clicks'] = day['inline_link_clicks']
+    format_data['spend'] = day['spend']
+
+    # Pull out conversion metric
+    conversions = [action.get('value') for action in day.get('actions', []) if action.get('action_type') == conversion_event]
+
+    if conversions:
+        format_data['conversions'] = conversions[0]
+    else:
+        format_data['conversions'] = "0"
+
+    return format_data
 
 if __name__ == '__main__':
     from flask import Flask, request
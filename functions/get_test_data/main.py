@@ -1,43 +1,78 @@
 from flask import jsonify
 import os
 import random
-from datetime import date, timedelta, datetime
+import numpy as np
+from datetime import datetime
+
+METRICS = {
+    "spend": 8000.00,
+    "clicks": 9900,
+    "impressions": 3050000,
+    "conversions": 1200
+}
 
 def main(request):
     app_id = os.environ.get('APP_ID')
     app_secret = os.environ.get('APP_SECRET')
     access_token = request.args.get('access_token')
 
-    account_id = request.args.get('account_id')
+    # account_id=1,2,3 or account_id=1&account_id=2 for a batch
+    account_ids = []
+    for value in request.args.getlist('account_id'):
+        account_ids.extend([account_id for account_id in value.split(',') if account_id])
+
     date_start = request.args.get('date_start')
     date_end = request.args.get('date_end')
+    columnar = request.args.get('format') == 'columns'
 
     s_date = datetime.strptime(date_start, '%Y-%m-%d')
     e_date = datetime.strptime(date_end, '%Y-%m-%d')
-    delta = e_date - s_date
-    
+
     epoch = datetime(1970,1,1)
     s_since_epoch = (s_date - epoch).days
     e_since_epoch = (e_date - epoch).days
-    random.seed(s_since_epoch + e_since_epoch + int(account_id))
-
-    data = []
-    for d in range(delta.days + 1):
-        date = datetime.strftime(s_date + timedelta(days=d), '%Y-%m-%d')
-        shift = random.random() + 0.5
-        data.append({
-            "date": str(date),
-            "spend": str(round(8000.00*shift,2)),
-            "clicks": str(round(9900*shift,2)),
-            "impressions": str(round(3050000*shift,2)),
-            "conversions": str(round(1200*shift,2))
-        })
+
+    dates = np.arange(s_since_epoch, e_since_epoch + 1).astype('datetime64[D]').astype(str)
+
+    data = {}
+    for account_id in account_ids:
+        shift = random_shift(s_since_epoch + e_since_epoch + int(account_id), len(dates))
+        columns = generate_columns(dates, shift)
+
+        if columnar:
+            data[account_id] = columns
+        else:
+            data[account_id] = to_rows(columns)
+
+    # a single account keeps the original response shape
+    if len(account_ids) == 1:
+        data = data[account_ids[0]]
 
     if app_id and app_secret and access_token:
         return jsonify(data)
     else:
         return None
 
+def random_shift(seed, size):
+    # Same draws as random.seed(seed) + random.random() per day, so the
+    # series for an account and date range stays the same as before
+    state = random.Random(seed).getstate()[1]
+    generator = np.random.RandomState()
+    generator.set_state(('MT19937', np.array(state[:624], dtype=np.uint32), state[624]))
+
+    return generator.random_sample(size) + 0.5
+
+def generate_columns(dates, shift):
+    columns = {"date": dates.tolist()}
+    for metric, base in METRICS.items():
+        columns[metric] = np.round(base * shift, 2).astype(str).tolist()
+    return columns
+
+def to_rows(columns):
+    keys = ["date"] + list(METRICS)
+    rows = [dict(zip(keys, values)) for values in zip(*[columns[key] for key in keys])]
+    return rows
+
 if __name__ == '__main__':
     from flask import Flask, request
     app = Flask(__name__)
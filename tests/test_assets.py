@@ -0,0 +1,46 @@
+from flask import Flask, url_for
+from app.assets import Assets, build
+
+
+def make_app(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'main.css').write_text('body { color: red; }\n' * 50)
+    build(str(static))
+
+    app = Flask(__name__, static_folder=str(static))
+    Assets(app)
+    return app
+
+def test_url_for_is_fingerprinted(tmp_path):
+    app = make_app(tmp_path)
+
+    with app.test_request_context():
+        url = url_for('static', filename='css/main.css')
+        missing = url_for('static', filename='css/other.css')
+
+    assert url.startswith('/static/dist/css/main.') and url.endswith('.css')
+    assert missing == '/static/css/other.css'
+
+def test_precompressed_and_immutable(tmp_path):
+    app = make_app(tmp_path)
+    client = app.test_client()
+
+    with app.test_request_context():
+        url = url_for('static', filename='css/main.css')
+
+    br = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert br.headers['Content-Encoding'] == 'br'
+    assert br.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in br.headers['Cache-Control']
+    assert br.headers['Vary'] == 'Accept-Encoding'
+
+    gzipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+
+    preferred = client.get(url, headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+    assert preferred.headers['Content-Encoding'] == 'gzip'
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == b'body { color: red; }\n' * 50
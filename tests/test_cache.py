@@ -0,0 +1,38 @@
+from app.cache import TTLCache, Versions
+import time
+
+def test_cache_hit_and_miss():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_cache_expires():
+    cache = TTLCache(maxsize=2, ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+def test_versions_bump():
+    versions = Versions()
+    before = versions.current([('team', 'a'), ('user', 'b')])
+    versions.bump(('team', 'a'))
+
+    after = versions.current([('team', 'a'), ('user', 'b')])
+    assert after[('team', 'a')] == before[('team', 'a')] + 1
+    assert after[('user', 'b')] == before[('user', 'b')]
@@ -0,0 +1,30 @@
+from app.charts.columns import InsightColumns, rolling_mean
+import numpy as np
+
+rows = [
+    {"date": "2020-01-01", "spend": "100.0", "clicks": "10", "impressions": "1000", "conversions": "4"},
+    {"date": "2020-01-02", "spend": "200.0", "clicks": "20", "impressions": "2000", "conversions": "0"},
+    {"date": "2020-01-03", "spend": "300.0", "clicks": "30", "impressions": "3000", "conversions": "6"},
+    {"date": "2020-01-04", "spend": "400.0", "clicks": "40", "impressions": "4000", "conversions": "10"}
+]
+
+def test_totals():
+    totals = InsightColumns.from_rows(rows).totals()
+
+    assert totals['spend'] == 1000.0
+    assert totals['conversions'] == 20.0
+    assert totals['cpa'] == 50.0
+
+def test_cpa_without_conversions_is_zero():
+    cpa = InsightColumns.from_rows(rows).cpa()
+
+    assert cpa.tolist() == [25.0, 0.0, 50.0, 40.0]
+
+def test_split_and_deltas():
+    previous, current = InsightColumns.from_rows(rows).split("2020-01-03")
+
+    assert previous.dates == ["2020-01-01", "2020-01-02"]
+    assert current.deltas(previous)['spend'] == 133.3
+
+def test_rolling_mean():
+    assert rolling_mean(np.array([1.0, 2.0, 3.0, 4.0]), 2).tolist() == [1.0, 1.5, 2.5, 3.5]
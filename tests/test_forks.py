@@ -0,0 +1,31 @@
+import os
+import pytest
+from app.forks import PerProcess
+
+def test_built_once():
+    built = []
+    value = PerProcess(lambda: built.append(1) or len(built))
+
+    assert value.get() == 1
+    assert value.get() == 1
+    assert built == [1]
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_rebuilt_after_fork():
+    built = []
+    discarded = []
+    value = PerProcess(lambda: built.append(os.getpid()) or os.getpid(), discard=discarded.append)
+    parent = value.get()
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child, report back what it sees and leave without running pytest's teardown
+        ok = value.get() == os.getpid() and discarded == [parent]
+        os.write(write, b'1' if ok else b'0')
+        os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    assert value.get() == parent
+    assert discarded == []
@@ -67,3 +67,21 @@ def test_get_test_data(func_tester):
             "spend": "11527.2"
         }]
     assert json.loads(response.data) == test_data
+
+def test_get_test_data_batch(func_tester):
+    response = func_tester.get('/', query_string=dict(access_token="Mike", account_id="123456789,987654321", date_start="2020-01-01", date_end="2020-01-07"))
+    assert response.status_code == 200
+    batch_data = json.loads(response.data)
+
+    single = func_tester.get('/', query_string=dict(access_token="Mike", account_id="123456789", date_start="2020-01-01", date_end="2020-01-07"))
+    assert batch_data["123456789"] == json.loads(single.data)
+    assert len(batch_data["987654321"]) == 7
+
+def test_get_test_data_columns(func_tester):
+    response = func_tester.get('/', query_string=dict(access_token="Mike", account_id="123456789", date_start="2020-01-01", date_end="2020-01-07", format="columns"))
+    assert response.status_code == 200
+    columns = json.loads(response.data)
+
+    assert columns["date"][0] == "2020-01-01"
+    assert columns["spend"][0] == "5360.61"
+    assert len(columns["conversions"]) == 7
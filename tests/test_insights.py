@@ -0,0 +1,81 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from app.charts import insights
+from app.charts.insights import get_insights, contiguous_ranges, insights_cache
+from config import Config
+
+PAYLOAD = {"account_id": "123", "conversion_event": "purchase", "date_start": "2020-01-01", "date_end": "2020-01-05"}
+
+def row(day):
+    return {"date": day, "impressions": "10", "clicks": "1", "spend": "2.5", "conversions": "1"}
+
+@pytest.fixture()
+def fetches(monkeypatch):
+    # [(date_start, date_end)] asked of the cloud function, every day but 2020-01-03 has delivery
+    fetches = []
+    def fetch_insights(function_name, payload, deadline=None):
+        fetches.append((payload['date_start'], payload['date_end']))
+        days = insights.date_range(payload['date_start'], payload['date_end'])
+        return [row(day) for day in days if day != '2020-01-03']
+
+    insights_cache.clear()
+    monkeypatch.setattr(insights, 'fetch_insights', fetch_insights)
+    monkeypatch.setattr(insights, 'read_rollups', lambda team_id, start_date, end_date: {})
+    yield fetches
+    insights_cache.clear()
+
+def test_contiguous_ranges():
+    days = ['2020-01-30', '2020-01-31', '2020-02-01', '2020-02-03']
+
+    assert contiguous_ranges(days) == [('2020-01-30', '2020-02-01'), ('2020-02-03', '2020-02-03')]
+    assert contiguous_ranges([]) == []
+
+def test_only_missing_days_are_fetched(fetches):
+    get_insights('get_test_data', dict(PAYLOAD, date_start='2020-01-02', date_end='2020-01-02'), 't1')
+    get_insights('get_test_data', dict(PAYLOAD, date_start='2020-01-04', date_end='2020-01-04'), 't1')
+    data = get_insights('get_test_data', PAYLOAD, 't1')
+
+    assert fetches[2:] == [('2020-01-01', '2020-01-01'), ('2020-01-03', '2020-01-03'), ('2020-01-05', '2020-01-05')]
+    assert [day['date'] for day in data] == ['2020-01-01', '2020-01-02', '2020-01-04', '2020-01-05']
+
+def test_empty_days_are_cached(fetches):
+    get_insights('get_test_data', PAYLOAD, 't1')
+    data = get_insights('get_test_data', PAYLOAD, 't1')
+
+    assert len(fetches) == 1
+    assert insights_cache.get(insights.cache_key('get_test_data', 't1', '123', 'purchase', '2020-01-03')) == {}
+    assert '2020-01-03' not in [day['date'] for day in data]
+
+def test_recent_days_expire_sooner(fetches, monkeypatch):
+    # yesterday too, the account's day may not have ended yet
+    monkeypatch.setattr(Config, 'INSIGHTS_TODAY_TTL', 0.01)
+    today = datetime.today()
+    yesterday = today - timedelta(days=1)
+    start = today - timedelta(days=2)
+    payload = dict(PAYLOAD, date_start=start.strftime('%Y-%m-%d'), date_end=today.strftime('%Y-%m-%d'))
+
+    get_insights('get_test_data', payload, 't1')
+    time.sleep(0.02)
+    get_insights('get_test_data', payload, 't1')
+
+    assert fetches[1] == (yesterday.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'))
+
+def test_cache_is_per_team(fetches):
+    get_insights('get_facebook_data', PAYLOAD, 't1')
+    get_insights('get_facebook_data', PAYLOAD, 't2')
+
+    assert len(fetches) == 2
+
+def test_rollups_must_match_account_and_event(fetches, monkeypatch):
+    rollups = {
+        "2020-01-01": dict(row('2020-01-01'), account_id='123', conversion_event='purchase'),
+        "2020-01-02": dict(row('2020-01-02'), account_id='old', conversion_event='purchase'),
+        "2020-01-03": {"date": "2020-01-03", "empty": True, "account_id": "123", "conversion_event": "purchase"}
+    }
+    monkeypatch.setattr(insights, 'read_rollups', lambda team_id, start_date, end_date: rollups)
+
+    data = get_insights('get_facebook_data', dict(PAYLOAD, date_end='2020-01-03'), 't1', rollups=True)
+
+    assert fetches == [('2020-01-02', '2020-01-02')]
+    assert [day['date'] for day in data] == ['2020-01-01', '2020-01-02']
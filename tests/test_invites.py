@@ -0,0 +1,21 @@
+import io
+from app.teams.invites import parse_invites
+
+ROLES = ['READ', 'EDIT', 'ADMIN']
+
+def test_parse_invites():
+    csv = b"email,role\nA@example.com,edit\nb@example.com\n\nnot-an-email\na@example.com,READ\nc@example.com,OWNER\n"
+    rows = parse_invites(io.BytesIO(csv), 'READ', ROLES)
+
+    assert [row['row'] for row in rows] == [2, 3, 5, 6, 7]
+    assert rows[0]['email'] == 'a@example.com' and rows[0]['role'] == 'EDIT' and rows[0]['status'] is None
+    assert rows[1]['role'] == 'READ' and rows[1]['status'] is None
+    assert rows[2]['status'] == 'error'
+    assert rows[3]['message'] == 'Listed more than once'
+    assert rows[4]['status'] == 'error'
+
+def test_parse_invites_without_header():
+    rows = parse_invites(io.BytesIO(b"\xef\xbb\xbfa@example.com,ADMIN\r\n"), 'READ', ROLES)
+
+    assert len(rows) == 1
+    assert rows[0]['email'] == 'a@example.com' and rows[0]['role'] == 'ADMIN'
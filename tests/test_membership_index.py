@@ -0,0 +1,46 @@
+import pytest
+from benchmarks.fakes import FakeStore, FakeDatabase
+from app.teams.models import Membership
+
+@pytest.fixture()
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr('app.teams.models.pyr_db', FakeDatabase(store))
+    yield store
+
+def test_index_follows_memberships(store):
+    membership = Membership.create('u1', 't1', 'READ')
+    assert store.read(['membership_index', 't1', 'u1']) == {"membership_id": membership.id, "role": "READ"}
+    assert Membership.user_role('u1', 't1') == 'READ'
+
+    membership.update('ADMIN')
+    assert Membership.team_index('t1') == {"u1": {"membership_id": membership.id, "role": "ADMIN"}}
+
+    membership.remove()
+    assert store.read(['membership_index']) is None
+    assert store.read(['memberships']) is None
+
+def test_create_rejects_existing_member(store):
+    Membership.create('u1', 't1', 'READ')
+
+    with pytest.raises(Exception):
+        Membership.create('u1', 't1', 'EDIT')
+
+def test_backfill_index(store):
+    store.write(['memberships'], {
+        "m1": {"team_id": "t1", "user_id": "u1", "role": "OWNER"},
+        "m2": {"team_id": "t2", "user_id": "u1", "role": "READ"}
+    })
+
+    assert Membership.backfill_index() == 2
+    assert store.read(['membership_index', 't2', 'u1']) == {"membership_id": "m2", "role": "READ"}
+
+def test_unindexed_team_falls_back_to_memberships(store):
+    store.write(['memberships', 'm1'], {"team_id": "t1", "user_id": "u1", "role": "OWNER"})
+
+    assert Membership.user_role('u1', 't1') == 'OWNER'
+    assert Membership.user_role('u2', 't1') is None
+    assert store.read(['membership_index', 't1']) == {"u1": {"membership_id": "m1", "role": "OWNER"}}
+
+    with pytest.raises(Exception):
+        Membership.create('u1', 't1', 'READ') # no duplicate before the backfill
@@ -0,0 +1,65 @@
+from flask import Flask
+from app import metrics
+from app.metrics import timed, Histogram
+from app.cache import TTLCache
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(METRICS_ENDPOINT=True, **config)
+    metrics.init_app(app)
+
+    @app.route('/two-calls')
+    def two_calls():
+        with timed('pyr_db'):
+            pass
+        with timed('pyr_db'):
+            pass
+        return 'ok'
+
+    @app.route('/no-calls')
+    def no_calls():
+        return 'ok'
+
+    return app
+
+def test_server_timing():
+    response = make_app().test_client().get('/two-calls')
+    timing = response.headers['Server-Timing']
+
+    assert 'pyr_db;desc="pyr_db x2"' in timing
+    assert 'total;dur=' in timing
+
+def test_requests_without_calls_are_counted():
+    client = make_app().test_client()
+    client.get('/no-calls')
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'fireflask_remote_calls_per_request_bucket{route="no_calls",backend="admin_auth",le="0"} 1' in body
+    assert 'fireflask_remote_calls_per_request_count{route="no_calls",backend="http"} 1' in body
+
+def test_metrics_token():
+    client = make_app(METRICS_TOKEN='secret').test_client()
+
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+def test_histogram_render():
+    histogram = Histogram('test_seconds', 'Test.', ['route'], [0.1, 1])
+    histogram.observe(0.5, 'index')
+
+    lines = histogram.render().split('\n')
+    assert 'test_seconds_bucket{route="index",le="0.1"} 0' in lines
+    assert 'test_seconds_bucket{route="index",le="1"} 1' in lines
+    assert 'test_seconds_bucket{route="index",le="+Inf"} 1' in lines
+    assert 'test_seconds_count{route="index"} 1' in lines
+
+def test_cache_stats():
+    cache = TTLCache(maxsize=2, ttl=60, name='test')
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    body = make_app().test_client().get('/metrics').get_data(as_text=True)
+    assert 'fireflask_cache_hits_total{cache="test"} 1' in body
+    assert 'fireflask_cache_misses_total{cache="test"} 1' in body
+    assert 'fireflask_cache_entries{cache="test"} 1' in body
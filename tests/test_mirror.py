@@ -0,0 +1,79 @@
+from app.teams.mirror import Mirror, firebase_source
+from benchmarks.fakes import FakeStore, FakeDatabase
+import time
+
+def wait_for(check, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+def streamed_mirror(store):
+    mirror = Mirror(source=lambda node, handler: firebase_source(node, handler, FakeDatabase(store)))
+    mirror.enabled = True
+    mirror.reconnect_delay = 0.01
+    assert wait_for(mirror.active)
+    return mirror
+
+def seeded_store():
+    store = FakeStore()
+    store.write(['teams'], {"t1": {"name": "One"}, "t2": {"name": "Two"}})
+    store.write(['memberships'], {
+        "m1": {"team_id": "t1", "user_id": "u1", "role": "OWNER"},
+        "m2": {"team_id": "t1", "user_id": "u2", "role": "READ"},
+        "m3": {"team_id": "t2", "user_id": "u1", "role": "ADMIN"}
+    })
+    return store
+
+def test_mirror_snapshot():
+    mirror = streamed_mirror(seeded_store())
+
+    assert mirror.team('t1') == {"name": "One"}
+    assert [membership_id for membership_id, _ in mirror.memberships_by('team_id', 't1')] == ['m1', 'm2']
+    assert [membership_id for membership_id, _ in mirror.memberships_by('user_id', 'u1')] == ['m1', 'm3']
+    assert mirror.role('u2', 't1') == 'READ'
+    assert mirror.team_index('t2') == {"u1": {"membership_id": "m3", "role": "ADMIN"}}
+
+def test_mirror_follows_writes():
+    store = seeded_store()
+    mirror = streamed_mirror(store)
+
+    store.write(['teams', 't1', 'name'], 'Renamed')
+    store.write(['memberships', 'm2', 'role'], 'EDIT')
+    store.write(['memberships', 'm3'], None)
+    store.write(['memberships', 'm4'], {"team_id": "t2", "user_id": "u2", "role": "READ"})
+
+    assert wait_for(lambda: mirror.role('u2', 't2') == 'READ')
+    assert mirror.team('t1') == {"name": "Renamed"}
+    assert mirror.role('u2', 't1') == 'EDIT'
+    assert mirror.role('u1', 't2') is None
+    assert [membership_id for membership_id, _ in mirror.memberships_by('user_id', 'u1')] == ['m1']
+
+def test_mirror_rebuilds_on_reconnect():
+    store = seeded_store()
+    mirror = streamed_mirror(store)
+
+    # changes made while disconnected only arrive in the next snapshot
+    with store.lock:
+        store.disconnect()
+        store.root['teams'].pop('t2')
+        store.root['memberships'].pop('m3')
+
+    assert wait_for(lambda: mirror.active() and mirror.team('t2') is None)
+    assert mirror.role('u1', 't2') is None
+    assert mirror.memberships_by('team_id', 't2') == []
+
+def test_mirror_applies_own_writes():
+    store = seeded_store()
+    mirror = streamed_mirror(store)
+
+    mirror.apply_update({
+        "memberships/m5": {"team_id": "t2", "user_id": "u3", "role": "READ"},
+        "membership_index/t2/u3": {"membership_id": "m5", "role": "READ"},
+        "teams/t2/name": "Second"
+    })
+
+    assert mirror.role('u3', 't2') == 'READ'
+    assert mirror.team('t2') == {"name": "Second"}
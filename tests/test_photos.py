@@ -0,0 +1,33 @@
+import io
+from PIL import Image
+from app.auth.models import User, resize_photo, PHOTO_SIZES
+
+BASE = 'https://storage.local/o/profiles%2Fuid1%2Fabc%2F{}.jpg?alt=media'
+
+def make_user(photo_url):
+    return User('uid1', 'a@example.com', 'A', True, None, photo_url)
+
+def test_resize_photo():
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 400), 'red').save(buffer, 'PNG')
+    buffer.seek(0)
+
+    variants = resize_photo(buffer)
+
+    assert list(variants) == PHOTO_SIZES
+    for size, data in variants.items():
+        image = Image.open(io.BytesIO(data))
+        assert image.format == 'JPEG'
+        assert image.size == (size, size)
+
+def test_photo_picks_smallest_covering_variant():
+    user = make_user(BASE.format(512))
+
+    assert user.photo(40) == BASE.format(64)
+    assert user.photo(64) == BASE.format(64)
+    assert user.photo(100) == BASE.format(256)
+    assert user.photo(1024) == BASE.format(512)
+
+def test_photo_without_variants():
+    assert make_user('https://example.com/me.png').photo(64) == 'https://example.com/me.png'
+    assert 'gravatar.com' in make_user(None).photo(64)
@@ -0,0 +1,51 @@
+import time
+from flask import Flask, g
+from app.auth.models import User
+from app import tasks
+from app.auth.snapshot import save_snapshot, load_snapshot, watch_photo
+
+def make_app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    return app
+
+def make_user(created=1577836800000):
+    return User('uid1', 'a@example.com', 'A', True, created, None)
+
+def test_snapshot_round_trip():
+    with make_app().test_request_context():
+        save_snapshot(make_user())
+        user = load_snapshot('uid1')
+
+        assert user.id == 'uid1'
+        assert user.email == 'a@example.com'
+        assert load_snapshot('someone else') is None
+
+def test_snapshot_revalidates():
+    with make_app().test_request_context() as context:
+        save_snapshot(make_user())
+        context.session['user']['checked_at'] = time.time() - 3600
+        assert load_snapshot('uid1') is None # too old
+
+        save_snapshot(make_user(), checked=False)
+        assert load_snapshot('uid1') is None # rotated
+
+        save_snapshot(make_user(created=None))
+        assert load_snapshot('uid1').created is None # from token claims, fetched by view_profile
+
+        save_snapshot(make_user())
+        g.revalidate_user = True
+        assert load_snapshot('uid1') is None # sensitive route
+
+def test_snapshot_waits_for_photo_upload(monkeypatch):
+    jobs = {1: {"status": "running"}}
+    monkeypatch.setattr(tasks, 'job', lambda job_id: jobs.get(job_id))
+
+    with make_app().test_request_context():
+        save_snapshot(make_user())
+        watch_photo(1)
+        assert load_snapshot('uid1') is not None # old photo while it uploads
+
+        jobs[1]['status'] = 'done'
+        assert load_snapshot('uid1') is None # new photo_url
+        assert load_snapshot('uid1') is not None
@@ -0,0 +1,67 @@
+import time
+from flask import Flask
+from app.tasks import TaskQueue
+
+
+def make_queue(tmp_path, workers=1):
+    app = Flask(__name__)
+    app.config.update(
+        TASKS_DB=str(tmp_path / 'tasks.db'),
+        TASK_WORKERS=workers,
+        TASK_MAX_ATTEMPTS=2,
+        TASK_BACKOFF=0,
+        TASK_TIMEOUT=300
+    )
+    return TaskQueue(app)
+
+def wait_for(queue, owner, status):
+    for i in range(50):
+        jobs = queue.jobs(owner)
+        if jobs and all(job['status'] == status for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    return queue.jobs(owner)
+
+def test_task_runs(tmp_path):
+    queue = make_queue(tmp_path)
+    sent = []
+    queue.task('send')(lambda email: sent.append(email))
+
+    queue.enqueue('send', {"email": "a@example.com"}, owner='user')
+
+    jobs = wait_for(queue, 'user', 'done')
+    assert jobs[0]['status'] == 'done'
+    assert sent == ['a@example.com']
+
+def test_task_retries_then_fails(tmp_path):
+    queue = make_queue(tmp_path)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise Exception('mail server down')
+    queue.task('broken')(broken)
+
+    job_id = queue.enqueue('broken', {}, owner='user')
+
+    jobs = wait_for(queue, 'user', 'failed')
+    assert jobs[0]['status'] == 'failed'
+    assert jobs[0]['attempts'] == 2
+    assert 'mail server down' in jobs[0]['last_error']
+    assert len(attempts) == 2
+
+    # someone else can't retry it, the owner can
+    assert not queue.retry(job_id, 'someone else')
+    assert queue.retry(job_id, 'user')
+    wait_for(queue, 'user', 'failed')
+    assert len(attempts) == 4
+
+def test_enqueue_before_init_app(tmp_path):
+    # models enqueue without an app, the table is made on first use
+    queue = TaskQueue()
+    queue.path = str(tmp_path / 'tasks.db')
+    queue.workers = 0
+
+    job_id = queue.enqueue('send', {"email": "a@example.com"}, owner='user')
+
+    assert [job['id'] for job in queue.jobs('user')] == [job_id]
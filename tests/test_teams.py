@@ -25,4 +25,15 @@ def test_membership_invite(team, user, password):
     assert user.email == 'test@example.com'
 
     print("")
-    membership.remove()
\ No newline at end of file
+    membership.remove()
+
+def test_create_team_with_owner(user):
+    team = Team.create('Team Owner Tester', owner_id=user.id)
+
+    assert team.name == 'Team Owner Tester'
+    assert Team.get(team.id).name == 'Team Owner Tester'
+    assert Membership.user_role(user.id, team.id) == 'OWNER'
+
+    owner_membership = Membership.get(Membership.team_index(team.id)[user.id]['membership_id'])
+    owner_membership.remove()
+    team.remove()